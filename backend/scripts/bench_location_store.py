@@ -0,0 +1,75 @@
+"""
+Memory and lookup benchmark of the App gateway location store.
+
+Compares a dict of (lat, long, ts) tuples with LocationArrayStore.
+
+Usage (from the backend directory):
+    python -m scripts.bench_location_store --entries 1000000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+import numpy as np
+
+from services.app.locations import LocationArrayStore
+
+
+def measure(name: str, build, lookup, ids):
+    """Prints the memory held by the structure built by `build` and the lookup time."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = build()
+    build_s = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for key in ids:
+        lookup(store, key)
+    lookup_us = (time.perf_counter() - start) / len(ids) * 1e6
+
+    print(
+        f"{name:<20} memory: {current / 2**20:8.1f} MiB (peak {peak / 2**20:8.1f} MiB)"
+        f"  build: {build_s:6.2f} s  lookup: {lookup_us:5.2f} us"
+    )
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    ids = [f"{i:032x}" for i in range(args.entries)]  # UUID-hex sized IDs
+    # Kept as arrays so that each builder allocates its own values, like live updates do
+    lats = rng.uniform(8.0, 35.0, args.entries)
+    lons = rng.uniform(68.0, 97.0, args.entries)
+    tss = time.time() - rng.uniform(0, 300, args.entries)
+    sample = [ids[i] for i in rng.integers(0, args.entries, args.lookups)]
+
+    print(f"{args.entries} entries, {args.lookups} lookups (IDs not counted)")
+
+    def build_dict():
+        return {
+            key: (float(lat), float(lon), float(ts))
+            for key, lat, lon, ts in zip(ids, lats, lons, tss)
+        }
+
+    def build_array():
+        store = LocationArrayStore()
+        for key, lat, lon, ts in zip(ids, lats, lons, tss):
+            store.set(key, lat, lon, ts)
+        return store
+
+    measure("dict of tuples", build_dict, dict.get, sample)
+    measure("LocationArrayStore", build_array, LocationArrayStore.get, sample)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Latency benchmark of SearchService on a synthetic service catalog.
+
+Usage (from the backend directory):
+    python -m scripts.bench_search --services 100000
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from services.search.services import SearchService
+from shared.enums import ServiceCategory
+
+WORDS = (
+    "ac foam jet lite split window repair service installation uninstallation "
+    "gas refill cooling power noise smell water leakage fridge refrigerator door "
+    "single double inverter washing machine front top load geyser chimney kitchen "
+    "bathroom sofa carpet deep cleaning intense classic move in tap mixer flush "
+    "tank pipe blockage drain fan light switch socket wiring mcb inverter battery"
+).split()
+
+CLAIMS = [
+    "Free revisit within 10 days for any post-service issues.",
+    "One-click hassle-free claims",
+    "Cover up to ₹10,000 for any damage during the service",
+]
+
+QUERIES = ["plumbr", "frige", "aircon", "clening", "ac repair", "geysr", "tap", "sofa"]
+
+
+class StaticCatalog:
+    """Catalog stand-in serving a fixed list of services."""
+
+    def __init__(self, services):
+        self.services = services
+
+    def version(self):
+        return 1
+
+    def all(self):
+        return self.services
+
+
+def synthetic_catalog(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    categories = [category.value for category in ServiceCategory]
+    return [
+        {
+            "SID": sid,
+            "serviceCategory": rng.choice(categories),
+            "serviceName": " ".join(
+                rng.choices(WORDS, k=rng.randint(2, 6))
+            ).capitalize(),
+            "details": {
+                "price": f"₹{rng.randint(99, 4999)}",
+                "claims": CLAIMS[: rng.randint(0, 3)],
+            },
+        }
+        for sid in range(1, size + 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--services", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    catalog = StaticCatalog(synthetic_catalog(args.services))
+
+    start = time.perf_counter()
+    search_service = SearchService(catalog, refresh_interval_s=float("inf"))
+    print(f"{args.services} services, indexed in {time.perf_counter() - start:.2f} s")
+
+    for query in QUERIES:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results = search_service.search_services(query, limit=args.limit)
+            timings.append(time.perf_counter() - start)
+        timings = np.array(timings) * 1e3
+        print(
+            f"{query!r:<14} p50: {np.percentile(timings, 50):6.3f} ms"
+            f"  p99: {np.percentile(timings, 99):6.3f} ms  results: {len(results)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
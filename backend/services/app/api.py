@@ -1,30 +1,47 @@
 from datetime import datetime
+import math
+from typing import List, Optional, Tuple
 from uuid import UUID
 from flask import Flask, request, jsonify
+from flask_socketio import SocketIO, join_room, leave_room
 from omegaconf import DictConfig
 import requests
 from dotenv import load_dotenv
 
 from services.booking.services import BookingService
 from services.booking.schemas import Booking, BookingCreate
+from services.app.dispatcher import BatchDispatcher
+from services.app.state import StateStore, create_state_store
+from shared.catalog import ServiceCatalogCache
+from shared.db import register_teardown
+from shared.enums import ServiceCategory
+from shared.geo import is_valid_location
 from shared.utils import get_logger, with_hydra_config, get_device_ip
 
 load_dotenv()
 
 app = Flask(__name__)
+socketio = SocketIO()
 
 logger = get_logger("app")
 
-# Store active technicians and their statuses
-active_technicians = {}
-bookings = {}  # tid: (sid, cid, bid)
-
-technician_loc = {}  # tid: (lat, long)
-customer_loc = {}  # cid: (lat, long)
+# Technician statuses and locations, customer locations and bookings (tid: (sid, cid, bid)),
+# kept in this process or in Redis depending on app.state.backend
+state: StateStore
 
 service_api_url: str
 technician_api_url: str
 
+# In-process copy of the service catalog, shared with booking_service
+service_catalog: ServiceCatalogCache
+
+match_radius_km: float
+max_match_candidates: int
+max_long_poll_s: float
+
+# Set when app.dispatcher.enabled, booking requests are then matched in batches
+dispatcher: Optional[BatchDispatcher] = None
+
 booking_service: BookingService
 
 
@@ -41,21 +58,37 @@ def update_technician_status():
 
     Expected JSON input:
     {
-        "technician_id": "string",  # The ID of the technician
-        "status": "string"           # The status of the technician ("active" or "inactive")
+        "technician_id": "string",     # The ID of the technician
+        "status": "string",            # The status of the technician ("active" or "inactive")
+        "service_category": "string"   # Optional, looked up from the technician service when omitted
     }
 
     Returns:
     - 200: Status updated successfully
-    - 400: Technician ID is required
+    - 400: Technician ID is missing or malformed, or the service category is invalid
     """
 
     data = request.get_json()
     technician_id = data.get("technician_id")
     status = data.get("status")  # "active" or "inactive"
+    service_category = data.get("service_category")
+
+    if technician_id:
+        try:
+            UUID(technician_id)
+        except (ValueError, TypeError, AttributeError):
+            logger.error(f"Invalid technician ID: {technician_id}")
+            return jsonify({"error": "Invalid technician ID"}), 400
+
+    if service_category is not None:
+        try:
+            service_category = ServiceCategory(service_category)
+        except ValueError:
+            logger.error(f"Invalid service category: {service_category}")
+            return jsonify({"error": "Invalid service category"}), 400
 
     if technician_id:
-        active_technicians[technician_id] = status
+        state.set_technician_status(technician_id, status, service_category)
         logger.info(f"Technician {technician_id} status updated to {status}")
         return jsonify({"message": "Status updated"}), 200
     logger.error("Technician ID is required")
@@ -92,38 +125,28 @@ def handle_booking_request():
         f"Booking request received from customer {customer_id} for service {service_id}"
     )
 
-    def find_technician(available_technicians, sid):
-        """Find a technician that matches the service category."""
-        response = requests.get(f"{service_api_url}/{sid}")
+    def find_technician(sid):
+        """Find the nearest active technician of the service's category."""
+        service_data = service_catalog.get(sid)
 
-        if response.status_code == 200:
-            service_data = response.json()
-        elif response.status_code == 404:
+        if service_data is None:
             logger.warning(f"Service with ID {sid} not found.")
             return None
-        else:
-            logger.error(f"Error retrieving service data: {response.status_code}")
-            return None
 
-        for tid in available_technicians.keys():
-            response = requests.get(f"{technician_api_url}/{tid}")
-            technician_data = response.json()
+        service_category = ServiceCategory(service_data["serviceCategory"])
+
+        if dispatcher is not None:
+            # Wait for the batch this request falls in to be assigned
+            return dispatcher.submit(service_category, latitude, longitude).result()
 
-            logger.info(service_data)
-            logger.info(technician_data)
+        candidates = find_candidates(service_category, latitude, longitude)
 
-            if technician_data["service_category"] == service_data["serviceCategory"]:
-                return tid
+        if candidates:
+            return candidates[0][0]
         logger.warning("No matching technician found")
         return None
 
-    available_technicians = {
-        tid: status for tid, status in active_technicians.items() if status == "active"
-    }
-
-    logger.info(f"Available technicians: {available_technicians}")
-
-    selected_technician = find_technician(available_technicians, service_id)
+    selected_technician = find_technician(service_id)
 
     if selected_technician:
         # Create booking data using the extracted address, latitude, and longitude
@@ -140,14 +163,140 @@ def handle_booking_request():
         )
         new_booking: Booking = booking_service.create_booking(booking_data)
         logger.info(f"Booking created in booking service: {new_booking.BID}")
-        bookings[selected_technician] = (service_id, customer_id, new_booking.BID)
+        state.set_booking(
+            selected_technician, (service_id, customer_id, str(new_booking.BID))
+        )
+        notify_booking(selected_technician)
         return jsonify({"status": "pending", "technician_id": selected_technician}), 200
     else:
         logger.warning(f"No technician available for customer {customer_id}")
         return jsonify({"status": "no_technician_available"}), 404
 
 
-# 3: Called by technician continuously until gets response
+def find_candidates(
+    service_category: ServiceCategory,
+    latitude: Optional[float],
+    longitude: Optional[float],
+) -> List[Tuple[str, float]]:
+    """
+    Returns the active technicians of a category as (tid, distance_km), nearest first.
+
+    Without a customer location every active technician of the category is a
+    candidate, at the matching radius as its distance.
+    """
+    resolve_technician_categories()
+
+    if latitude is None or longitude is None:
+        candidates = state.active_technicians_in(service_category)
+        logger.info(f"Available technicians: {candidates}")
+        return [(tid, match_radius_km) for tid in candidates]
+
+    # Nearest active technicians of the category, within the matching radius
+    nearby = state.nearest_active_technicians(
+        service_category,
+        latitude,
+        longitude,
+        k=max_match_candidates,
+        radius_km=match_radius_km,
+    )
+    logger.info(f"Nearby technicians: {nearby}")
+    return nearby
+
+
+def resolve_technician_categories():
+    """
+    Looks up the service category of active technicians that did not send one
+    with their status, using a single batch request to the technician service.
+
+    Technicians the technician service does not know (or returns without a
+    valid category) are dropped, so they are not looked up again before
+    every booking.
+    """
+    tids = state.uncategorized_technicians()
+    if not tids:
+        return
+
+    response = requests.post(f"{technician_api_url}/batch", json={"tids": tids})
+
+    if response.status_code != 200:
+        logger.error(f"Error retrieving technician data: {response.status_code}")
+        return
+
+    # The technician service returns TIDs in canonical form
+    unresolved = {str(UUID(tid)): tid for tid in tids}
+    for technician in response.json():
+        tid = unresolved.get(technician["TID"])
+        if tid is None:
+            continue
+        try:
+            category = ServiceCategory(technician["service_category"])
+        except ValueError:
+            logger.error(
+                f"Invalid service category of technician {tid}: "
+                f"{technician['service_category']}"
+            )
+            continue
+        state.set_technician_category(tid, category)
+        del unresolved[technician["TID"]]
+
+    for tid in unresolved.values():
+        logger.warning(f"Dropping technician {tid} from the active technicians")
+        state.remove_technician(tid)
+
+
+def booking_payload(technician_id):
+    """Returns the booking assigned to a technician as a JSON-ready dict, or None."""
+    booking = state.get_booking(technician_id)
+    if booking is None:
+        return None
+    return {
+        "service_id": booking[0],
+        "customer_id": booking[1],
+        "booking_id": booking[2],
+    }
+
+
+def notify_booking(technician_id):
+    """Pushes a new booking to the technician's socket room (long-polls are woken by the state store)."""
+    socketio.emit(
+        "booking", {"bookings": booking_payload(technician_id)}, to=technician_id
+    )
+
+
+@app.route("/dispatcher/metrics", methods=["GET"])
+def get_dispatcher_metrics():
+    """
+    Retrieve throughput and wait-time metrics of the batch dispatcher.
+
+    Returns:
+    - 200: Dispatcher metrics
+    - 404: Batch dispatching is disabled
+    """
+    if dispatcher is None:
+        return jsonify({"message": "Batch dispatching is disabled"}), 404
+    return jsonify(dispatcher.metrics()), 200
+
+
+@app.route("/catalog/invalidate", methods=["POST"])
+def invalidate_service_catalog():
+    """
+    Called by the service microservice when a service is created, updated or deleted.
+
+    Expected JSON input (optional):
+    {
+        "sid": int   # The changed service, the whole catalog is reloaded when omitted
+    }
+
+    Returns:
+    - 200: Cached copy dropped
+    """
+    sid = (request.get_json(silent=True) or {}).get("sid")
+    service_catalog.invalidate(sid)
+    logger.debug(f"Service catalog invalidated: {sid if sid is not None else 'all'}")
+    return jsonify({"message": "Service catalog invalidated"}), 200
+
+
+# 3: Called by technician until gets response (long-poll with "wait", or subscribe over Socket.IO)
 @app.route("/get/booking", methods=["GET"])
 def get_bookings():
     """
@@ -155,6 +304,8 @@ def get_bookings():
 
     Expected query parameters:
     - tid: string (Technician ID)
+    - wait: float (Optional, seconds to hold the request open until a booking
+      is assigned, capped at app.long_poll.max_wait_s)
 
     Returns:
     - 200: Bookings retrieved successfully
@@ -167,16 +318,13 @@ def get_bookings():
         logger.error("Technician ID (tid) is required")
         return jsonify({"error": "Technician ID (tid) is required"}), 400
 
+    wait = min(request.args.get("wait", 0, type=float), max_long_poll_s)
+
+    if wait > 0:
+        state.wait_for_booking(technician_id, timeout=wait)
+
     # Retrieve booking for the given technician ID
-    technician_bookings = (
-        {
-            "service_id": bookings[technician_id][0],
-            "customer_id": bookings[technician_id][1],
-            "booking_id": bookings[technician_id][2],
-        }
-        if technician_id in bookings
-        else None
-    )
+    technician_bookings = booking_payload(technician_id)
 
     if technician_bookings:
         logger.info(
@@ -184,10 +332,47 @@ def get_bookings():
         )
         return jsonify({"bookings": technician_bookings}), 200
     else:
-        logger.warning(f"No bookings found for technician {technician_id}")
+        logger.debug(f"No bookings found for technician {technician_id}")
         return jsonify({"message": "No bookings found for this technician"}), 404
 
 
+@socketio.on("subscribe")
+def subscribe_bookings(data):
+    """
+    Subscribes the connected technician to its booking notifications.
+
+    Expected payload:
+    {
+        "tid": "string"  # The ID of the technician
+    }
+
+    Emits "booking" with {"bookings": {...}} to the technician when a booking
+    is assigned, and right away if one is already pending.
+    """
+    technician_id = (data or {}).get("tid")
+
+    if not technician_id:
+        return {"error": "Technician ID (tid) is required"}
+
+    join_room(technician_id)
+    logger.info(f"Technician {technician_id} subscribed to booking notifications")
+
+    technician_bookings = booking_payload(technician_id)
+    if technician_bookings:
+        socketio.emit("booking", {"bookings": technician_bookings}, to=request.sid)
+
+    return {"message": "Subscribed"}
+
+
+@socketio.on("unsubscribe")
+def unsubscribe_bookings(data):
+    """Stops booking notifications for the technician in the payload."""
+    technician_id = (data or {}).get("tid")
+
+    if technician_id:
+        leave_room(technician_id)
+
+
 # 4: Technician calls the "{booking_api}/bookings/<bid>" to get the booking info (incl customer id as uid)
 
 
@@ -201,17 +386,19 @@ def update_technician_location():
     {
         "tid": "string",      # The ID of the technician
         "longitude": float,    # The longitude of the technician's location
-        "latitude": float      # The latitude of the technician's location
+        "latitude": float,     # The latitude of the technician's location
+        "ts": float            # Optional, unix time of the GPS fix (defaults to now)
     }
 
     Returns:
     - 200: Technician location added successfully
-    - 400: Technician ID, longitude, and latitude are required
+    - 400: Technician ID, longitude, and latitude are required, within range
     """
     data = request.get_json()
     technician_id = data.get("tid")
     longitude = data.get("longitude")
     latitude = data.get("latitude")
+    ts = data.get("ts")
 
     if not technician_id or longitude is None or latitude is None:
         logger.error("Technician ID, longitude, and latitude are required")
@@ -220,14 +407,77 @@ def update_technician_location():
             400,
         )
 
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        latitude = longitude = math.nan
+    if not is_valid_location(latitude, longitude):
+        logger.error(f"Invalid technician location: ({longitude}, {latitude})")
+        return jsonify({"error": "Invalid longitude or latitude"}), 400
+
     # Store the technician's location
-    technician_loc[technician_id] = (latitude, longitude)
+    state.set_technician_location(technician_id, latitude, longitude, ts)
     logger.info(
         f"Technician {technician_id} location updated to: ({longitude}, {latitude})"
     )
     return jsonify({"message": "Technician location added successfully"}), 200
 
 
+# Called by technician apps (or a relay batching them)
+@app.route("/technician/locations", methods=["POST"])
+def update_technician_locations():
+    """
+    Add many technician locations in one request.
+
+    Expected JSON input:
+    {
+        "locations": [
+            ["tid", latitude, longitude, ts],  # ts: unix time of the GPS fix
+            ...
+        ]
+    }
+
+    Several points of one technician are coalesced to the newest, and points
+    older than the stored location are dropped. Points with coordinates out of
+    range or not finite are rejected.
+
+    Returns:
+    - 200: Counts of received, applied and rejected (malformed or out of range) points
+    - 400: A list of locations is required
+    """
+    data = request.get_json()
+    locations = data.get("locations") if isinstance(data, dict) else None
+
+    if not isinstance(locations, list):
+        logger.error("A list of locations is required")
+        return jsonify({"error": "A list of locations is required"}), 400
+
+    updates = []
+    for location in locations:
+        try:
+            tid, latitude, longitude, ts = location
+            latitude, longitude, ts = float(latitude), float(longitude), float(ts)
+        except (TypeError, ValueError):
+            continue
+        if is_valid_location(latitude, longitude) and math.isfinite(ts):
+            updates.append((str(tid), latitude, longitude, ts))
+
+    applied = state.update_technician_locations(updates)
+    logger.info(
+        f"Technician locations batch: {len(locations)} received, {applied} applied"
+    )
+    return (
+        jsonify(
+            {
+                "received": len(locations),
+                "applied": applied,
+                "rejected": len(locations) - len(updates),
+            }
+        ),
+        200,
+    )
+
+
 # Called by customer
 @app.route("/customer/location", methods=["POST"])
 def update_customer_location():
@@ -258,7 +508,7 @@ def update_customer_location():
         )
 
     # Store the customer's location
-    customer_loc[customer_id] = (latitude, longitude)
+    state.set_customer_location(customer_id, latitude, longitude)
     logger.info(
         f"Customer {customer_id} location updated to: ({longitude}, {latitude})"
     )
@@ -286,7 +536,7 @@ def get_customer_location():
         return jsonify({"error": "Customer ID (cid) is required"}), 400
 
     # Retrieve the customer's location
-    location = customer_loc.get(customer_id)
+    location = state.get_customer_location(customer_id)
 
     if location:
         logger.info(f"Location retrieved for customer {customer_id}: {location}")
@@ -325,7 +575,7 @@ def get_technician_location():
         return jsonify({"error": "Technician ID (tid) is required"}), 400
 
     # Retrieve the technician's location
-    location = technician_loc.get(technician_id)
+    location = state.get_technician_location(technician_id)
 
     if location:
         logger.info(f"Location retrieved for technician {technician_id}: {location}")
@@ -363,8 +613,7 @@ def delete_customer_location():
         logger.error("Customer ID (cid) is required")
         return jsonify({"error": "Customer ID (cid) is required"}), 400
 
-    if customer_id in customer_loc:
-        del customer_loc[customer_id]
+    if state.delete_customer_location(customer_id):
         logger.info(f"Deleted location for customer {customer_id}")
         return jsonify({"message": "Customer location deleted successfully"}), 200
     else:
@@ -392,8 +641,7 @@ def delete_technician_location():
         logger.error("Technician ID (tid) is required")
         return jsonify({"error": "Technician ID (tid) is required"}), 400
 
-    if technician_id in technician_loc:
-        del technician_loc[technician_id]
+    if state.delete_technician_location(technician_id):
         logger.info(f"Deleted location for technician {technician_id}")
         return jsonify({"message": "Technician location deleted successfully"}), 200
     else:
@@ -421,8 +669,7 @@ def delete_active_technician():
         logger.error("Technician ID (tid) is required")
         return jsonify({"error": "Technician ID (tid) is required"}), 400
 
-    if technician_id in active_technicians:
-        del active_technicians[technician_id]
+    if state.remove_technician(technician_id):
         logger.info(f"Deleted active technician {technician_id}")
         return jsonify({"message": "Active technician deleted successfully"}), 200
     else:
@@ -450,8 +697,7 @@ def delete_booking():
         logger.error("Technician ID (tid) is required")
         return jsonify({"error": "Technician ID (tid) is required"}), 400
 
-    if technician_id in bookings:
-        del bookings[technician_id]
+    if state.delete_booking(technician_id):
         logger.info(f"Deleted booking for technician {technician_id}")
         return jsonify({"message": "Booking deleted successfully"}), 200
     else:
@@ -461,10 +707,35 @@ def delete_booking():
 
 @with_hydra_config
 def main(cfg: DictConfig):
-    global service_api_url, technician_api_url, booking_service
+    global service_api_url, technician_api_url, service_catalog, booking_service
+    global state, match_radius_km, max_match_candidates, max_long_poll_s
+    global dispatcher
 
     logger.info("Initializing App server...")
 
+    state = create_state_store(cfg.app)
+
+    # Workers sharing Redis state also share Socket.IO rooms through it
+    socketio.init_app(
+        app,
+        message_queue=(
+            cfg.app.state.redis_url if cfg.app.state.backend == "redis" else None
+        ),
+    )
+
+    match_radius_km = cfg.app.matching.radius_km
+    max_match_candidates = cfg.app.matching.max_candidates
+    max_long_poll_s = cfg.app.long_poll.max_wait_s
+
+    if cfg.app.dispatcher.enabled:
+        dispatcher = BatchDispatcher(
+            find_candidates,
+            window_s=cfg.app.dispatcher.window_ms / 1000,
+            max_batch_size=cfg.app.dispatcher.max_batch_size,
+            logger=logger,
+        )
+        dispatcher.start()
+
     ip_addr = get_device_ip()
 
     service_api_url = f"http://{ip_addr}:{cfg.service.server.port}/services"
@@ -472,16 +743,24 @@ def main(cfg: DictConfig):
 
     user_api_url = f"http://{ip_addr}:{cfg.user.server.port}/users"
 
+    service_catalog = ServiceCatalogCache(
+        service_api_url, ttl_s=cfg.app.service_catalog.ttl_s, logger=logger
+    )
+
     booking_service = BookingService(
-        cfg.database.url,
+        cfg.database,
         user_service_url=user_api_url,
         technician_service_url=technician_api_url,
         service_service_url=service_api_url,
+        service_catalog=service_catalog,
     )
+    register_teardown(app, booking_service.db)
 
     logger.info("Starting Flask server...")
 
-    app.run(host="0.0.0.0", port=cfg.app.server.port, debug=True)
+    # The Werkzeug server is what app.run used before Socket.IO, flask-socketio
+    # refuses it outside a terminal unless allowed
+    socketio.run(app, **cfg.app.server, allow_unsafe_werkzeug=True)
 
 
 if __name__ == "__main__":
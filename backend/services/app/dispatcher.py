@@ -0,0 +1,227 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from shared.enums import ServiceCategory
+
+# Cost of a (request, technician) pair that cannot be matched. It is finite so
+# the assignment still runs, and large enough that any feasible match wins.
+UNASSIGNABLE = 1e9
+
+CandidatesFn = Callable[
+    [ServiceCategory, Optional[float], Optional[float]], List[Tuple[str, float]]
+]
+
+
+@dataclass
+class DispatchRequest:
+    service_category: ServiceCategory
+    latitude: Optional[float]
+    longitude: Optional[float]
+    future: Future = field(default_factory=Future)
+    submitted_at: float = field(default_factory=time.monotonic)
+
+
+def min_cost_assignment(cost: List[List[float]]) -> List[Tuple[int, int]]:
+    """
+    Solves the rectangular assignment problem (Hungarian algorithm, O(n^2 m)).
+
+    Args:
+        cost: cost[i][j] of assigning row i to column j.
+
+    Returns:
+        The (row, column) pairs of a minimum-cost matching of size min(rows, columns).
+    """
+    if not cost or not cost[0]:
+        return []
+
+    transposed = len(cost) > len(cost[0])
+    if transposed:
+        cost = [list(column) for column in zip(*cost)]
+
+    n, m = len(cost), len(cost[0])
+    inf = float("inf")
+    u = [0.0] * (n + 1)  # row potentials
+    v = [0.0] * (m + 1)  # column potentials
+    p = [0] * (m + 1)  # p[j]: row matched to column j (1-based, 0 = free)
+    way = [0] * (m + 1)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = p[j0], inf, 0
+            row = cost[i0 - 1]
+            for j in range(1, m + 1):
+                if not used[j]:
+                    reduced = row[j - 1] - u[i0] - v[j]
+                    if reduced < minv[j]:
+                        minv[j], way[j] = reduced, j0
+                    if minv[j] < delta:
+                        delta, j1 = minv[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    pairs = [(p[j] - 1, j - 1) for j in range(1, m + 1) if p[j]]
+    if transposed:
+        pairs = [(row, column) for column, row in pairs]
+    return pairs
+
+
+class BatchDispatcher:
+    """
+    Collects booking requests over a short window and assigns them together.
+
+    The first request of a batch opens a window of `window_s` seconds (or
+    until `max_batch_size` requests are waiting). All requests of the batch
+    are then matched to distinct technicians with a min-cost bipartite
+    assignment on distance, and every waiting request is answered at once.
+    """
+
+    def __init__(
+        self,
+        candidates_fn: CandidatesFn,
+        window_s: float = 0.2,
+        max_batch_size: int = 64,
+        logger=None,
+    ):
+        self.candidates_fn = candidates_fn
+        self.window_s = window_s
+        self.max_batch_size = max_batch_size
+        self.logger = logger
+
+        self._queue: "queue.Queue[DispatchRequest]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._metrics_lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self._batches = 0
+        self._requests = 0
+        self._assigned = 0
+        self._total_wait_s = 0.0
+        self._max_wait_s = 0.0
+        self._max_batch = 0
+
+    def start(self):
+        self._started_at = time.monotonic()
+        self._thread.start()
+
+    def submit(
+        self,
+        service_category: ServiceCategory,
+        latitude: Optional[float],
+        longitude: Optional[float],
+    ) -> Future:
+        """Queues a request. The future resolves to the assigned tid or None."""
+        dispatch_request = DispatchRequest(service_category, latitude, longitude)
+        self._queue.put(dispatch_request)
+        return dispatch_request.future
+
+    def metrics(self) -> Dict[str, float]:
+        """Returns throughput and wait-time counters since start."""
+        with self._metrics_lock:
+            uptime_s = time.monotonic() - self._started_at
+            return {
+                "batches": self._batches,
+                "requests": self._requests,
+                "assigned": self._assigned,
+                "unassigned": self._requests - self._assigned,
+                "avg_batch_size": (
+                    self._requests / self._batches if self._batches else 0.0
+                ),
+                "max_batch_size": self._max_batch,
+                "avg_wait_ms": (
+                    1000 * self._total_wait_s / self._requests
+                    if self._requests
+                    else 0.0
+                ),
+                "max_wait_ms": 1000 * self._max_wait_s,
+                "throughput_rps": self._requests / uptime_s if uptime_s else 0.0,
+            }
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window_s
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                assignments = self._assign(batch)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Error dispatching batch: {str(e)}")
+                for dispatch_request in batch:
+                    dispatch_request.future.set_exception(e)
+                continue
+
+            self._record(batch, assignments)
+            for dispatch_request, tid in zip(batch, assignments):
+                dispatch_request.future.set_result(tid)
+
+    def _assign(self, batch: List[DispatchRequest]) -> List[Optional[str]]:
+        """Returns the tid assigned to each request of the batch (or None)."""
+        candidate_costs: List[Dict[str, float]] = []
+        columns: Dict[str, int] = {}  # tid: column in the cost matrix
+
+        for dispatch_request in batch:
+            costs = dict(
+                self.candidates_fn(
+                    dispatch_request.service_category,
+                    dispatch_request.latitude,
+                    dispatch_request.longitude,
+                )
+            )
+            candidate_costs.append(costs)
+            for tid in costs:
+                columns.setdefault(tid, len(columns))
+
+        tids = list(columns)
+        cost = [
+            [costs.get(tid, UNASSIGNABLE) for tid in tids] for costs in candidate_costs
+        ]
+
+        assignments: List[Optional[str]] = [None] * len(batch)
+        for row, column in min_cost_assignment(cost):
+            if cost[row][column] < UNASSIGNABLE:
+                assignments[row] = tids[column]
+
+        if self.logger:
+            self.logger.info(
+                f"Dispatched batch of {len(batch)} requests over {len(tids)} technicians"
+            )
+        return assignments
+
+    def _record(self, batch: List[DispatchRequest], assignments: List[Optional[str]]):
+        now = time.monotonic()
+        with self._metrics_lock:
+            self._batches += 1
+            self._requests += len(batch)
+            self._assigned += sum(tid is not None for tid in assignments)
+            self._max_batch = max(self._max_batch, len(batch))
+            for dispatch_request in batch:
+                wait_s = now - dispatch_request.submitted_at
+                self._total_wait_s += wait_s
+                self._max_wait_s = max(self._max_wait_s, wait_s)
@@ -0,0 +1,71 @@
+import heapq
+import threading
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+class ExpiryHeap:
+    """
+    Lazy expiry of keys with a per-key TTL.
+
+    Refreshing a key pushes a new deadline and leaves the old heap entry in
+    place; stale entries are skipped when they reach the top. Checking for
+    expired keys is O(1) when there are none, and the heap is rebuilt when
+    stale entries outnumber live keys so memory stays bounded.
+    """
+
+    def __init__(self):
+        self._deadlines: Dict[Hashable, float] = {}  # key: current deadline
+        self._heap: List[Tuple[float, int, Hashable]] = []  # (deadline, seq, key)
+        self._seq = 0  # tie-breaker, keys need not be comparable
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def touch(self, key: Hashable, ttl: Optional[float], now: Optional[float] = None):
+        """(Re)sets the deadline of `key` to now + ttl. A falsy ttl means no expiry."""
+        if not ttl:
+            self.discard(key)
+            return
+
+        deadline = (time.monotonic() if now is None else now) + ttl
+        with self._lock:
+            self._deadlines[key] = deadline
+            self._seq += 1
+            heapq.heappush(self._heap, (deadline, self._seq, key))
+            if len(self._heap) > 2 * len(self._deadlines) + 64:
+                self._compact()
+
+    def discard(self, key: Hashable):
+        """Stops tracking `key` (its heap entries become stale)."""
+        with self._lock:
+            self._deadlines.pop(key, None)
+
+    def pop_if_expired(self, key: Hashable, now: Optional[float] = None) -> bool:
+        """Stops tracking `key` and returns True if its deadline has passed."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            deadline = self._deadlines.get(key)
+            if deadline is None or deadline > now:
+                return False
+            del self._deadlines[key]  # its heap entry is now stale
+            return True
+
+    def pop_expired(self, now: Optional[float] = None) -> List[Hashable]:
+        """Removes and returns the keys whose deadline has passed."""
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, key = heapq.heappop(self._heap)
+                if self._deadlines.get(key) == deadline:
+                    del self._deadlines[key]
+                    expired.append(key)
+        return expired
+
+    def _compact(self):
+        self._heap = [
+            entry for entry in self._heap if self._deadlines.get(entry[2]) == entry[0]
+        ]
+        heapq.heapify(self._heap)
@@ -0,0 +1,93 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from shared.geo import haversine_km_array
+
+
+class LocationArrayStore:
+    """
+    Compact store of (lat, long, ts) per ID.
+
+    Coordinates live in contiguous float64 arrays indexed by slot, with an
+    id -> slot map and a free-list of slots released by removals. Arrays grow
+    by doubling. Distances to many IDs are computed directly on the arrays.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.lat = np.full(capacity, np.nan)
+        self.lon = np.full(capacity, np.nan)
+        self.ts = np.full(capacity, np.nan)
+
+        self._slots: Dict[str, int] = {}  # id: slot
+        self._ids: List[Optional[str]] = [None] * capacity  # slot: id
+        self._free: List[int] = list(range(capacity - 1, -1, -1))
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._slots
+
+    def slot(self, key: str) -> Optional[int]:
+        """Returns the slot of `key` or None."""
+        return self._slots.get(key)
+
+    def id_at(self, slot: int) -> Optional[str]:
+        """Returns the ID stored in `slot` or None."""
+        return self._ids[slot]
+
+    def set(self, key: str, lat: float, lon: float, ts: float = np.nan) -> int:
+        """Stores the location of `key`. Returns its slot."""
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                if not self._free:
+                    self._grow()
+                slot = self._free.pop()
+                self._slots[key] = slot
+                self._ids[slot] = key
+            self.lat[slot] = lat
+            self.lon[slot] = lon
+            self.ts[slot] = ts
+            return slot
+
+    def get(self, key: str) -> Optional[Tuple[float, float]]:
+        """Returns the (lat, long) of `key` or None."""
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        return float(self.lat[slot]), float(self.lon[slot])
+
+    def get_ts(self, key: str) -> Optional[float]:
+        """Returns the timestamp stored with `key` or None."""
+        slot = self._slots.get(key)
+        if slot is None or np.isnan(self.ts[slot]):
+            return None
+        return float(self.ts[slot])
+
+    def remove(self, key: str) -> bool:
+        """Removes `key`. Returns False if it was not stored."""
+        with self._lock:
+            slot = self._slots.pop(key, None)
+            if slot is None:
+                return False
+            self._ids[slot] = None
+            self.lat[slot] = self.lon[slot] = self.ts[slot] = np.nan
+            self._free.append(slot)
+            return True
+
+    def distances(self, lat: float, lon: float, slots: np.ndarray) -> np.ndarray:
+        """Great-circle distances in km from (lat, long) to the given slots."""
+        return haversine_km_array(lat, lon, self.lat[slots], self.lon[slots])
+
+    def _grow(self):
+        capacity = len(self._ids)
+        for name in ("lat", "lon", "ts"):
+            grown = np.full(2 * capacity, np.nan)
+            grown[:capacity] = getattr(self, name)
+            setattr(self, name, grown)
+        self._ids.extend([None] * capacity)
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
@@ -0,0 +1,44 @@
+import threading
+from typing import Callable, Dict
+
+
+class BookingNotifier:
+    """
+    Wakes up long-polling technicians when a booking is assigned to them.
+
+    Each waiting technician parks on its own Event, so publishing a booking
+    only wakes the requests of that technician.
+    """
+
+    def __init__(self):
+        self._events: Dict[str, threading.Event] = {}  # tid: event
+        self._waiters: Dict[str, int] = {}  # tid: number of parked requests
+        self._lock = threading.Lock()
+
+    def wait(self, tid: str, is_ready: Callable[[], bool], timeout: float) -> bool:
+        """
+        Blocks until `is_ready()` is true for `tid` or `timeout` seconds pass.
+
+        Returns:
+            True if `is_ready()` became true, False on timeout.
+        """
+        with self._lock:
+            event = self._events.setdefault(tid, threading.Event())
+            self._waiters[tid] = self._waiters.get(tid, 0) + 1
+
+        try:
+            # Checked after registering so a publish in between is not missed
+            return is_ready() or (event.wait(timeout) and is_ready())
+        finally:
+            with self._lock:
+                self._waiters[tid] -= 1
+                if not self._waiters[tid]:
+                    del self._waiters[tid]
+                    del self._events[tid]
+
+    def publish(self, tid: str):
+        """Wakes up every request parked for `tid`."""
+        with self._lock:
+            event = self._events.get(tid)
+        if event is not None:
+            event.set()
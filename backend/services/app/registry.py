@@ -0,0 +1,100 @@
+import threading
+from typing import Dict, List, Optional, Set
+
+from shared.enums import ServiceCategory
+
+ACTIVE = "active"
+
+
+class ActiveTechnicianRegistry:
+    """
+    Technician statuses partitioned by ServiceCategory.
+
+    Active technicians are kept in one set per category, so a booking only
+    looks at the candidates of the requested category. Technicians whose
+    category is not known yet are parked in a separate set until it is
+    resolved. Every status change or removal is O(1).
+    """
+
+    def __init__(self):
+        self._status: Dict[str, str] = {}  # tid: status
+        self._category: Dict[str, ServiceCategory] = {}  # tid: category
+        self._active: Dict[ServiceCategory, Set[str]] = {
+            category: set() for category in ServiceCategory
+        }
+        self._uncategorized: Set[str] = set()  # active tids without a category
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._status)
+
+    def __contains__(self, tid: str) -> bool:
+        return tid in self._status
+
+    def status(self, tid: str) -> Optional[str]:
+        """Returns the last status set for `tid` or None."""
+        return self._status.get(tid)
+
+    def category(self, tid: str) -> Optional[ServiceCategory]:
+        """Returns the known ServiceCategory of `tid` or None."""
+        return self._category.get(tid)
+
+    def set_status(
+        self, tid: str, status: str, category: Optional[ServiceCategory] = None
+    ):
+        """Sets the status (and optionally the category) of `tid`."""
+        with self._lock:
+            self._unlink(tid)
+            self._status[tid] = status
+            if category is not None:
+                self._category[tid] = category
+            self._link(tid)
+
+    def set_category(self, tid: str, category: ServiceCategory):
+        """Records the ServiceCategory of an already registered technician."""
+        with self._lock:
+            if tid not in self._status:
+                return
+            self._unlink(tid)
+            self._category[tid] = category
+            self._link(tid)
+
+    def remove(self, tid: str) -> bool:
+        """Forgets `tid`. Returns False if it was not registered."""
+        with self._lock:
+            if tid not in self._status:
+                return False
+            self._unlink(tid)
+            del self._status[tid]
+            self._category.pop(tid, None)
+            return True
+
+    def is_active_in(self, tid: str, category: ServiceCategory) -> bool:
+        """True if `tid` is active and belongs to `category`."""
+        return tid in self._active[category]
+
+    def active_in(self, category: ServiceCategory) -> List[str]:
+        """Returns the active tids of one category."""
+        with self._lock:
+            return list(self._active[category])
+
+    def uncategorized(self) -> List[str]:
+        """Returns the active tids whose category is still unknown."""
+        with self._lock:
+            return list(self._uncategorized)
+
+    def _link(self, tid: str):
+        if self._status.get(tid) != ACTIVE:
+            return
+        category = self._category.get(tid)
+        if category is None:
+            self._uncategorized.add(tid)
+        else:
+            self._active[category].add(tid)
+
+    def _unlink(self, tid: str):
+        category = self._category.get(tid)
+        if category is None:
+            self._uncategorized.discard(tid)
+        else:
+            self._active[category].discard(tid)
@@ -0,0 +1,141 @@
+import threading
+from math import cos, radians, ceil, floor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from services.app.locations import LocationArrayStore
+from shared.geo import KM_PER_DEGREE_LAT
+
+Cell = Tuple[int, int]
+
+
+class GeoGridIndex:
+    """
+    Uniform lat/long grid over technician positions.
+
+    Every point lives in exactly one square cell of `cell_size_km`, so an update
+    is O(1) and a nearest-neighbour query only visits the rings of cells around
+    the query point until it has `k` hits that are provably the closest ones.
+    Points are kept in a LocationArrayStore and cells hold slots, so distances
+    of a whole ring are computed in one vectorized call.
+    """
+
+    def __init__(self, cell_size_km: float = 1.0):
+        self.cell_size_km = cell_size_km
+        self.cell_deg = cell_size_km / KM_PER_DEGREE_LAT
+
+        self.points = LocationArrayStore()
+        self._cells: Dict[Cell, Set[int]] = {}  # cell: {slot}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __contains__(self, tid: str) -> bool:
+        return tid in self.points
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        return floor(lat / self.cell_deg), floor(lon / self.cell_deg)
+
+    def update(self, tid: str, lat: float, lon: float, ts: float = np.nan):
+        """Inserts or moves the point of `tid` (with the timestamp of the fix)."""
+        cell = self._cell(lat, lon)
+        with self._lock:
+            old = self.points.get(tid)
+            old_cell = self._cell(*old) if old is not None else None
+            slot = self.points.set(tid, lat, lon, ts)
+            if old_cell != cell:
+                if old_cell is not None:
+                    self._discard_from_cell(slot, old_cell)
+                self._cells.setdefault(cell, set()).add(slot)
+
+    def get(self, tid: str) -> Optional[Tuple[float, float]]:
+        """Returns the (lat, long) of `tid` or None."""
+        return self.points.get(tid)
+
+    def get_ts(self, tid: str) -> Optional[float]:
+        """Returns the timestamp of the point of `tid` or None."""
+        return self.points.get_ts(tid)
+
+    def remove(self, tid: str) -> bool:
+        """Removes `tid` from the index. Returns False if it was not indexed."""
+        with self._lock:
+            point = self.points.get(tid)
+            if point is None:
+                return False
+            self._discard_from_cell(self.points.slot(tid), self._cell(*point))
+            return self.points.remove(tid)
+
+    def _discard_from_cell(self, slot: int, cell: Cell):
+        members = self._cells[cell]
+        members.discard(slot)
+        if not members:
+            del self._cells[cell]
+
+    def _ring(self, cx: int, cy: int, r: int):
+        """Yields the cells on the square ring at Chebyshev distance `r`."""
+        if r == 0:
+            yield cx, cy
+            return
+        for dy in range(-r, r + 1):
+            yield cx - r, cy + dy
+            yield cx + r, cy + dy
+        for dx in range(-r + 1, r):
+            yield cx + dx, cy - r
+            yield cx + dx, cy + r
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        radius_km: float,
+        predicate: Optional[Callable[[str], bool]] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Finds the `k` nearest points within `radius_km` of (lat, long).
+
+        Args:
+            lat, lon: The query location.
+            k: Maximum number of results.
+            radius_km: Search radius in kilometres.
+            predicate: Optional filter on the tid (e.g. only active technicians).
+
+        Returns:
+            A list of (tid, distance_km) sorted by distance.
+        """
+        cx, cy = self._cell(lat, lon)
+
+        # Longitude cells shrink with cos(latitude), so the number of rings
+        # needed to cover the radius, and the distance a scanned block is
+        # guaranteed to cover, are computed on the narrower side.
+        cos_lat = cos(radians(min(89.0, abs(lat) + radius_km / KM_PER_DEGREE_LAT)))
+        ring_km = self.cell_size_km * cos_lat
+        max_ring = ceil(radius_km / ring_km)
+
+        found: List[Tuple[float, str]] = []
+
+        with self._lock:
+            for r in range(max_ring + 1):
+                slots = [
+                    slot
+                    for cell in self._ring(cx, cy, r)
+                    for slot in self._cells.get(cell, ())
+                ]
+                if slots:
+                    slots = np.fromiter(slots, dtype=np.intp, count=len(slots))
+                    distances = self.points.distances(lat, lon, slots)
+                    within = distances <= radius_km
+                    for slot, distance in zip(slots[within], distances[within]):
+                        tid = self.points.id_at(slot)
+                        if predicate is None or predicate(tid):
+                            found.append((float(distance), tid))
+
+                if len(found) >= k:
+                    found.sort()
+                    if found[k - 1][0] <= r * ring_km:
+                        break
+
+        found.sort()
+        return [(tid, distance) for distance, tid in found[:k]]
@@ -0,0 +1,516 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import redis
+from omegaconf import DictConfig
+
+from services.app.expiry import ExpiryHeap
+from services.app.locations import LocationArrayStore
+from services.app.notifier import BookingNotifier
+from services.app.registry import ActiveTechnicianRegistry, ACTIVE
+from services.app.spatial import GeoGridIndex
+from shared.enums import ServiceCategory
+
+Location = Tuple[float, float]  # (lat, long)
+BookingRef = Tuple[str, str, str]  # (sid, cid, bid)
+LocationUpdate = Tuple[str, float, float, float]  # (tid, lat, long, ts)
+
+# Kinds of entries with their own TTL (app.state.ttl.<kind>_s)
+TECHNICIAN = "technician"
+TECHNICIAN_LOCATION = "technician_location"
+CUSTOMER_LOCATION = "customer_location"
+BOOKING = "booking"
+
+
+def coalesce_location_updates(
+    updates: Iterable[LocationUpdate],
+) -> Dict[str, Tuple[float, float, float]]:
+    """Keeps only the newest update of each technician in a batch, as tid: (lat, long, ts)."""
+    latest: Dict[str, Tuple[float, float, float]] = {}
+    for tid, lat, lon, ts in updates:
+        current = latest.get(tid)
+        if current is None or ts > current[2]:
+            latest[tid] = (lat, lon, ts)
+    return latest
+
+
+class StateStore(ABC):
+    """
+    Shared state of the app gateway: technician statuses and locations,
+    customer locations and the booking assigned to each technician.
+
+    Every entry expires after the TTL of its kind unless it is updated again.
+    A technician's location update also refreshes its status, so technicians
+    whose app stopped sending locations drop out of matching.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None):
+        self.ttls = ttls or {}  # kind: seconds, falsy for no expiry
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        """Deletes the entries whose TTL has passed. Returns how many were deleted."""
+
+    def _delete_expired(self, kind: str, key: str):
+        if kind == TECHNICIAN:
+            self.remove_technician(key)
+        elif kind == TECHNICIAN_LOCATION:
+            self.delete_technician_location(key)
+        elif kind == CUSTOMER_LOCATION:
+            self.delete_customer_location(key)
+        elif kind == BOOKING:
+            self.delete_booking(key)
+
+    # Technician statuses
+
+    @abstractmethod
+    def set_technician_status(
+        self, tid: str, status: str, category: Optional[ServiceCategory] = None
+    ):
+        """Sets the status (and optionally the service category) of a technician."""
+
+    @abstractmethod
+    def set_technician_category(self, tid: str, category: ServiceCategory):
+        """Records the service category of an already registered technician."""
+
+    @abstractmethod
+    def remove_technician(self, tid: str) -> bool:
+        """Forgets a technician's status. Returns False if it was not registered."""
+
+    @abstractmethod
+    def active_technicians_in(self, category: ServiceCategory) -> List[str]:
+        """Returns the active technicians of a service category."""
+
+    @abstractmethod
+    def uncategorized_technicians(self) -> List[str]:
+        """Returns the active technicians whose service category is unknown."""
+
+    # Technician locations
+
+    @abstractmethod
+    def update_technician_locations(self, updates: Iterable[LocationUpdate]) -> int:
+        """
+        Applies a batch of technician location updates in one pass.
+
+        Duplicates of a technician are coalesced to the newest one, and updates
+        not newer than the stored location (by ts) are dropped.
+
+        Returns:
+            The number of technicians whose location changed.
+        """
+
+    def set_technician_location(
+        self, tid: str, lat: float, lon: float, ts: Optional[float] = None
+    ) -> bool:
+        """Stores a technician's location. Returns False if a newer one is already stored."""
+        ts = time.time() if ts is None else ts
+        return self.update_technician_locations([(tid, lat, lon, ts)]) == 1
+
+    @abstractmethod
+    def get_technician_location(self, tid: str) -> Optional[Location]:
+        """Returns a technician's (lat, long) or None."""
+
+    @abstractmethod
+    def delete_technician_location(self, tid: str) -> bool:
+        """Deletes a technician's location. Returns False if there was none."""
+
+    @abstractmethod
+    def nearest_active_technicians(
+        self,
+        category: ServiceCategory,
+        lat: float,
+        lon: float,
+        k: int,
+        radius_km: float,
+    ) -> List[Tuple[str, float]]:
+        """Returns up to k active technicians of a category within radius_km as (tid, distance_km), nearest first."""
+
+    # Customer locations
+
+    @abstractmethod
+    def set_customer_location(self, cid: str, lat: float, lon: float):
+        """Stores a customer's location."""
+
+    @abstractmethod
+    def get_customer_location(self, cid: str) -> Optional[Location]:
+        """Returns a customer's (lat, long) or None."""
+
+    @abstractmethod
+    def delete_customer_location(self, cid: str) -> bool:
+        """Deletes a customer's location. Returns False if there was none."""
+
+    # Bookings
+
+    @abstractmethod
+    def set_booking(self, tid: str, booking: BookingRef):
+        """Assigns a booking to a technician and wakes up its waiting requests."""
+
+    @abstractmethod
+    def get_booking(self, tid: str) -> Optional[BookingRef]:
+        """Returns the booking assigned to a technician or None."""
+
+    @abstractmethod
+    def delete_booking(self, tid: str) -> bool:
+        """Deletes a technician's booking. Returns False if there was none."""
+
+    @abstractmethod
+    def wait_for_booking(self, tid: str, timeout: float) -> bool:
+        """Blocks until a booking is assigned to the technician or timeout seconds pass."""
+
+
+class InMemoryStateStore(StateStore):
+    """State kept in this process. Fast, but lost on restart and not shared between workers."""
+
+    def __init__(
+        self, cell_size_km: float = 1.0, ttls: Optional[Dict[str, float]] = None
+    ):
+        super().__init__(ttls)
+        self.expiry = ExpiryHeap()  # (kind, key) deadlines
+        self.technicians = ActiveTechnicianRegistry()
+        self.technician_loc = GeoGridIndex(cell_size_km)  # tid: (lat, long, ts)
+        self._location_lock = threading.Lock()
+        self.customer_loc = LocationArrayStore()  # cid: (lat, long)
+        self.bookings = {}  # tid: (sid, cid, bid)
+        self.booking_notifier = BookingNotifier()
+
+    def _touch(self, kind: str, key: str):
+        self.expiry.touch((kind, key), self.ttls.get(kind))
+
+    def purge_expired(self):
+        expired = self.expiry.pop_expired()
+        for kind, key in expired:
+            self._delete_expired(kind, key)
+        return len(expired)
+
+    def _purge_if_expired(self, kind: str, key: str):
+        """Deletes one entry past its deadline, so reads never return it before the next sweep."""
+        if self.expiry.pop_if_expired((kind, key)):
+            self._delete_expired(kind, key)
+
+    def set_technician_status(self, tid, status, category=None):
+        self.purge_expired()
+        self.technicians.set_status(tid, status, category)
+        self._touch(TECHNICIAN, tid)
+
+    def set_technician_category(self, tid, category):
+        self.technicians.set_category(tid, category)
+
+    def remove_technician(self, tid):
+        self.expiry.discard((TECHNICIAN, tid))
+        return self.technicians.remove(tid)
+
+    def active_technicians_in(self, category):
+        self.purge_expired()
+        return self.technicians.active_in(category)
+
+    def uncategorized_technicians(self):
+        self.purge_expired()
+        return self.technicians.uncategorized()
+
+    def update_technician_locations(self, updates):
+        self.purge_expired()
+        applied = 0
+        with self._location_lock:
+            for tid, (lat, lon, ts) in coalesce_location_updates(updates).items():
+                stored_ts = self.technician_loc.get_ts(tid)
+                if stored_ts is not None and ts <= stored_ts:
+                    continue
+                self.technician_loc.update(tid, lat, lon, ts)
+                self._touch(TECHNICIAN_LOCATION, tid)
+                if tid in self.technicians:
+                    self._touch(TECHNICIAN, tid)
+                applied += 1
+        return applied
+
+    def get_technician_location(self, tid):
+        self._purge_if_expired(TECHNICIAN_LOCATION, tid)
+        return self.technician_loc.get(tid)
+
+    def delete_technician_location(self, tid):
+        self.expiry.discard((TECHNICIAN_LOCATION, tid))
+        with self._location_lock:
+            return self.technician_loc.remove(tid)
+
+    def nearest_active_technicians(self, category, lat, lon, k, radius_km):
+        self.purge_expired()
+        return self.technician_loc.nearest(
+            lat,
+            lon,
+            k=k,
+            radius_km=radius_km,
+            predicate=lambda tid: self.technicians.is_active_in(tid, category),
+        )
+
+    def set_customer_location(self, cid, lat, lon):
+        self.purge_expired()
+        self.customer_loc.set(cid, lat, lon)
+        self._touch(CUSTOMER_LOCATION, cid)
+
+    def get_customer_location(self, cid):
+        self._purge_if_expired(CUSTOMER_LOCATION, cid)
+        return self.customer_loc.get(cid)
+
+    def delete_customer_location(self, cid):
+        self.expiry.discard((CUSTOMER_LOCATION, cid))
+        return self.customer_loc.remove(cid)
+
+    def set_booking(self, tid, booking):
+        self.purge_expired()
+        self.bookings[tid] = booking
+        self._touch(BOOKING, tid)
+        self.booking_notifier.publish(tid)
+
+    def get_booking(self, tid):
+        self._purge_if_expired(BOOKING, tid)
+        return self.bookings.get(tid)
+
+    def delete_booking(self, tid):
+        self.expiry.discard((BOOKING, tid))
+        return self.bookings.pop(tid, None) is not None
+
+    def wait_for_booking(self, tid, timeout):
+        return self.booking_notifier.wait(
+            tid, lambda: self.get_booking(tid) is not None, timeout=timeout
+        )
+
+
+class RedisStateStore(StateStore):
+    """
+    State kept in Redis, shared by every gateway worker and kept across restarts.
+
+    Technician locations use a Redis geo set, active technicians one set per
+    service category, and long-polling workers block on a per-technician list
+    that is pushed to whenever a booking is assigned. Entry deadlines live in
+    one sorted set that workers sweep at most every `sweep_interval_s`.
+    """
+
+    UNCATEGORIZED = "uncategorized"
+    NOTIFY_TTL_S = 60
+    SWEEP_BATCH = 1000
+
+    def __init__(
+        self,
+        redis_url: str,
+        key_prefix: str = "smartfix:app:",
+        ttls: Optional[Dict[str, float]] = None,
+        sweep_interval_s: float = 1.0,
+    ):
+        super().__init__(ttls)
+        self.redis = redis.Redis.from_url(redis_url, decode_responses=True)
+        self.prefix = key_prefix
+        self.sweep_interval_s = sweep_interval_s
+        self._next_sweep = 0.0
+
+    def _key(self, *parts: str) -> str:
+        return self.prefix + ":".join(parts)
+
+    def _active_key(self, category: Optional[str]) -> str:
+        return self._key("active", category or self.UNCATEGORIZED)
+
+    def _touch(self, pipe, kind: str, key: str, only_existing: bool = False):
+        ttl = self.ttls.get(kind)
+        if ttl:
+            pipe.zadd(
+                self._key("expiry"),
+                {f"{kind}|{key}": time.time() + ttl},
+                xx=only_existing,
+            )
+
+    def purge_expired(self):
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return 0
+        self._next_sweep = now + self.sweep_interval_s
+
+        expired = self.redis.zrangebyscore(
+            self._key("expiry"), "-inf", time.time(), start=0, num=self.SWEEP_BATCH
+        )
+        if not expired:
+            return 0
+
+        # ZREM decides which worker deletes an entry when several sweep at once
+        pipe = self.redis.pipeline()
+        for member in expired:
+            pipe.zrem(self._key("expiry"), member)
+        claimed = [member for member, ok in zip(expired, pipe.execute()) if ok]
+
+        for member in claimed:
+            kind, key = member.split("|", 1)
+            self._delete_expired(kind, key)
+        return len(claimed)
+
+    def _forget(self, pipe, kind: str, key: str):
+        pipe.zrem(self._key("expiry"), f"{kind}|{key}")
+
+    def set_technician_status(self, tid, status, category=None):
+        self.purge_expired()
+        old_category = self.redis.hget(self._key("technician", "category"), tid)
+        new_category = category.value if category is not None else old_category
+
+        pipe = self.redis.pipeline()
+        pipe.srem(self._active_key(old_category), tid)
+        pipe.hset(self._key("technician", "status"), tid, status)
+        if category is not None:
+            pipe.hset(self._key("technician", "category"), tid, new_category)
+        if status == ACTIVE:
+            pipe.sadd(self._active_key(new_category), tid)
+        self._touch(pipe, TECHNICIAN, tid)
+        pipe.execute()
+
+    def set_technician_category(self, tid, category):
+        status = self.redis.hget(self._key("technician", "status"), tid)
+        if status is not None:
+            self.set_technician_status(tid, status, category)
+
+    def remove_technician(self, tid):
+        old_category = self.redis.hget(self._key("technician", "category"), tid)
+
+        pipe = self.redis.pipeline()
+        pipe.srem(self._active_key(old_category), tid)
+        pipe.hdel(self._key("technician", "category"), tid)
+        pipe.hdel(self._key("technician", "status"), tid)
+        self._forget(pipe, TECHNICIAN, tid)
+        return bool(pipe.execute()[-2])
+
+    def active_technicians_in(self, category):
+        self.purge_expired()
+        return list(self.redis.smembers(self._active_key(category.value)))
+
+    def uncategorized_technicians(self):
+        self.purge_expired()
+        return list(self.redis.smembers(self._active_key(None)))
+
+    def update_technician_locations(self, updates):
+        self.purge_expired()
+        latest = coalesce_location_updates(updates)
+        if not latest:
+            return 0
+
+        tids = list(latest)
+        stored_ts = self.redis.hmget(self._key("technician", "location_ts"), tids)
+
+        positions = []
+        timestamps = {}
+        for tid, ts in zip(tids, stored_ts):
+            lat, lon, new_ts = latest[tid]
+            if ts is not None and new_ts <= float(ts):
+                continue
+            positions.extend((lon, lat, tid))
+            timestamps[tid] = new_ts
+
+        if timestamps:
+            pipe = self.redis.pipeline()
+            pipe.geoadd(self._key("technician", "location"), positions)
+            pipe.hset(self._key("technician", "location_ts"), mapping=timestamps)
+            for tid in timestamps:
+                self._touch(pipe, TECHNICIAN_LOCATION, tid)
+                # Refresh the status only of technicians that still have one
+                self._touch(pipe, TECHNICIAN, tid, only_existing=True)
+            pipe.execute()
+        return len(timestamps)
+
+    def get_technician_location(self, tid):
+        position = self.redis.geopos(self._key("technician", "location"), tid)[0]
+        return (position[1], position[0]) if position else None
+
+    def delete_technician_location(self, tid):
+        pipe = self.redis.pipeline()
+        pipe.zrem(self._key("technician", "location"), tid)
+        pipe.hdel(self._key("technician", "location_ts"), tid)
+        self._forget(pipe, TECHNICIAN_LOCATION, tid)
+        return bool(pipe.execute()[0])
+
+    def nearest_active_technicians(self, category, lat, lon, k, radius_km):
+        self.purge_expired()
+        nearby = self.redis.geosearch(
+            self._key("technician", "location"),
+            longitude=lon,
+            latitude=lat,
+            radius=radius_km,
+            unit="km",
+            sort="ASC",
+            withdist=True,
+        )
+        if not nearby:
+            return []
+
+        active = self.redis.smismember(
+            self._active_key(category.value), [tid for tid, _ in nearby]
+        )
+        return [
+            (tid, distance)
+            for (tid, distance), is_active in zip(nearby, active)
+            if is_active
+        ][:k]
+
+    def set_customer_location(self, cid, lat, lon):
+        self.purge_expired()
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key("customer", "location"), cid, json.dumps([lat, lon]))
+        self._touch(pipe, CUSTOMER_LOCATION, cid)
+        pipe.execute()
+
+    def get_customer_location(self, cid):
+        location = self.redis.hget(self._key("customer", "location"), cid)
+        return tuple(json.loads(location)) if location else None
+
+    def delete_customer_location(self, cid):
+        pipe = self.redis.pipeline()
+        pipe.hdel(self._key("customer", "location"), cid)
+        self._forget(pipe, CUSTOMER_LOCATION, cid)
+        return bool(pipe.execute()[0])
+
+    def set_booking(self, tid, booking):
+        self.purge_expired()
+        notify_key = self._key("booking", "notify", tid)
+
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key("bookings"), tid, json.dumps([str(v) for v in booking]))
+        self._touch(pipe, BOOKING, tid)
+        pipe.delete(notify_key)
+        pipe.rpush(notify_key, 1)
+        pipe.expire(notify_key, self.NOTIFY_TTL_S)
+        pipe.execute()
+
+    def get_booking(self, tid):
+        booking = self.redis.hget(self._key("bookings"), tid)
+        return tuple(json.loads(booking)) if booking else None
+
+    def delete_booking(self, tid):
+        pipe = self.redis.pipeline()
+        pipe.hdel(self._key("bookings"), tid)
+        pipe.delete(self._key("booking", "notify", tid))
+        self._forget(pipe, BOOKING, tid)
+        return bool(pipe.execute()[0])
+
+    def wait_for_booking(self, tid, timeout):
+        if self.redis.hexists(self._key("bookings"), tid):
+            return True
+        self.redis.blpop([self._key("booking", "notify", tid)], timeout=timeout)
+        return bool(self.redis.hexists(self._key("bookings"), tid))
+
+
+def create_state_store(app_cfg: DictConfig) -> StateStore:
+    """Creates the state store selected by app.state.backend ("memory" or "redis")."""
+    backend = app_cfg.state.backend
+    ttls = {
+        TECHNICIAN: app_cfg.state.ttl.technician_s,
+        TECHNICIAN_LOCATION: app_cfg.state.ttl.technician_location_s,
+        CUSTOMER_LOCATION: app_cfg.state.ttl.customer_location_s,
+        BOOKING: app_cfg.state.ttl.booking_s,
+    }
+
+    if backend == "memory":
+        return InMemoryStateStore(app_cfg.location_index.cell_size_km, ttls)
+    if backend == "redis":
+        return RedisStateStore(
+            app_cfg.state.redis_url,
+            app_cfg.state.key_prefix,
+            ttls,
+            app_cfg.state.sweep_interval_s,
+        )
+
+    raise ValueError(f"Unknown app.state.backend: {backend}")
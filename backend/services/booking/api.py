@@ -4,8 +4,10 @@ from omegaconf import DictConfig
 from dotenv import load_dotenv
 
 from services.booking.services import BookingService
+from shared.catalog import ServiceCatalogCache
 from services.booking.schemas import BookingCreate, BookingUpdate
 from services.booking.models import Booking
+from shared.db import register_teardown
 from shared.utils import with_hydra_config, get_logger, get_device_ip
 
 load_dotenv()
@@ -15,6 +17,9 @@ logger = get_logger("booking")
 
 booking_service: BookingService
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
 
 @app.route("/bookings", methods=["POST"])
 def create_booking():
@@ -31,6 +36,60 @@ def create_booking():
         return jsonify({"error": type(e).__name__}), 409
 
 
+@app.route("/bookings", methods=["GET"])
+def list_bookings():
+    """
+    Lists bookings, newest first.
+
+    Query parameters (at least one of 'tid', 'uid' or 'status'):
+        - 'tid': Bookings of a technician.
+        - 'uid': Bookings of a customer.
+        - 'status': Bookings with this status.
+        - 'limit' (optional): Bookings per page, 20 by default and at most 100.
+        - 'cursor' (optional): The 'next_cursor' of the previous page.
+
+    Returns:
+        - 200 OK: {"bookings": [...], "next_cursor": str or null on the last page}
+        - 400 Bad Request: No filter or an invalid parameter.
+    """
+    logger.info(f"Received {request.method} request to /bookings")
+    tid = request.args.get("tid")
+    uid = request.args.get("uid")
+    status = request.args.get("status")
+    if tid is None and uid is None and status is None:
+        return jsonify({"error": "tid, uid or status is required"}), 400
+
+    try:
+        tid = UUID(tid) if tid is not None else None
+        uid = UUID(uid) if uid is not None else None
+    except ValueError:
+        return jsonify({"error": "Invalid TID or UID format"}), 400
+
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "Invalid limit value"}), 400
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": "Invalid limit value"}), 400
+
+    try:
+        bookings, next_cursor = booking_service.list_bookings(
+            tid, uid, status, limit, request.args.get("cursor")
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    return (
+        jsonify(
+            {
+                "bookings": [booking.to_dict() for booking in bookings],
+                "next_cursor": next_cursor,
+            }
+        ),
+        200,
+    )
+
+
 @app.route("/bookings/<bid>", methods=["GET"])
 def get_booking(bid: str):
     """
@@ -74,6 +133,22 @@ def update_booking_status(bid: str):
         return jsonify({"error": type(e).__name__}), 409
 
 
+@app.route("/catalog/invalidate", methods=["POST"])
+def invalidate_service_catalog():
+    """
+    Called by the service microservice when a service is created, updated or deleted.
+
+    Expected JSON input (optional):
+    {
+        "sid": int   # The changed service, the whole catalog is reloaded when omitted
+    }
+    """
+    sid = (request.get_json(silent=True) or {}).get("sid")
+    booking_service.service_catalog.invalidate(sid)
+    logger.debug(f"Service catalog invalidated: {sid if sid is not None else 'all'}")
+    return jsonify({"message": "Service catalog invalidated"}), 200
+
+
 @with_hydra_config
 def main(cfg: DictConfig):
     global booking_service
@@ -87,11 +162,15 @@ def main(cfg: DictConfig):
     service_api_url = f"http://{ip_addr}:{cfg.service.server.port}/services"
 
     booking_service = BookingService(
-        cfg.database.url,
+        cfg.database,
         user_api_url,
         technician_api_url,
         service_api_url,
+        ServiceCatalogCache(
+            service_api_url, ttl_s=cfg.booking.service_catalog.ttl_s, logger=logger
+        ),
     )
+    register_teardown(app, booking_service.db)
     logger.info("Starting Flask server...")
     app.run(**cfg.booking.server)
 
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, UUID, Integer, String, Float, DateTime, Time
+from sqlalchemy import Column, UUID, Integer, String, Float, DateTime, Time, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -7,6 +7,13 @@ Base = declarative_base()
 
 class Booking(Base):
     __tablename__ = "bookings"
+    # History queries page through one technician's, customer's or status's
+    # bookings newest first, BID breaking ties (see BookingService.list_bookings)
+    __table_args__ = (
+        Index("ix_bookings_tid_date", "TID", "booking_date", "BID"),
+        Index("ix_bookings_uid_date", "UID", "booking_date", "BID"),
+        Index("ix_bookings_status_date", "status", "booking_date", "BID"),
+    )
 
     BID = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     UID = Column(UUID(as_uuid=True), nullable=False)
@@ -1,8 +1,13 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import base64
+import json
+from datetime import datetime
+from omegaconf import DictConfig
+from sqlalchemy import tuple_
 from uuid import UUID
-from typing import Optional
+from typing import List, Optional, Tuple
 
+from shared.catalog import ServiceCatalogCache
+from shared.db import create_db_engine, create_scoped_session
 from shared.utils import get_logger
 from services.booking.schemas import BookingCreate, BookingUpdate
 from services.booking.models import Booking, Base
@@ -12,24 +17,33 @@ import requests
 class BookingService:
     def __init__(
         self,
-        db_url: str,
+        db_cfg: DictConfig,
         user_service_url: str,
         technician_service_url: str,
         service_service_url: str,
+        service_catalog: Optional[ServiceCatalogCache] = None,
     ):
         self.logger = get_logger("booking")
-        self.logger.debug("Connecting to database: %s", db_url)
+        self.logger.debug("Connecting to database: %s", db_cfg.url)
 
-        self.engine = create_engine(db_url, pool_size=20, max_overflow=10)
+        self.engine = create_db_engine(db_cfg)
         Base.metadata.create_all(self.engine)
+        # create_all skips tables that exist, so add indexes missing from older databases
+        for index in Booking.__table__.indexes:
+            index.create(self.engine, checkfirst=True)
 
-        self.session = sessionmaker(bind=self.engine)
-        self.db = self.session()
+        # A session per request thread, closed when the request ends
+        self.db = create_scoped_session(self.engine)
 
-        self.logger.info(f"Connected to database: %s", db_url)
+        self.logger.info(f"Connected to database: %s", db_cfg.url)
         self.user_service_url = user_service_url
         self.technician_service_url = technician_service_url
         self.service_service_url = service_service_url
+        # Services are read from an in-process copy of the catalog, shared with
+        # the caller when given
+        self.service_catalog = service_catalog or ServiceCatalogCache(
+            service_service_url, logger=self.logger
+        )
 
     def create_booking(self, booking_data: BookingCreate) -> Optional[Booking]:
         """Creates a new Booking"""
@@ -76,6 +90,49 @@ class BookingService:
 
         return booking
 
+    def list_bookings(
+        self,
+        TID: Optional[UUID] = None,
+        UID: Optional[UUID] = None,
+        status: Optional[str] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Booking], Optional[str]]:
+        """
+        Lists bookings, newest first, matching every filter given.
+
+        Pages are cut with keyset pagination on (booking_date, BID), so any
+        page costs one seek in the (TID|UID|status, booking_date, BID) index
+        however deep it is. Raises ValueError for an invalid cursor.
+
+        Returns:
+            The bookings and the cursor of the next page (None on the last one).
+        """
+        query = self.db.query(Booking)
+        if TID is not None:
+            query = query.filter(Booking.TID == TID)
+        if UID is not None:
+            query = query.filter(Booking.UID == UID)
+        if status is not None:
+            query = query.filter(Booking.status == status)
+        if cursor is not None:
+            booking_date, BID = decode_cursor(cursor)
+            # A row value comparison, so the cursor is a range of the index
+            query = query.filter(
+                tuple_(Booking.booking_date, Booking.BID) < (booking_date, BID)
+            )
+
+        bookings = (
+            query.order_by(Booking.booking_date.desc(), Booking.BID.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        next_cursor = (
+            encode_cursor(bookings[limit - 1]) if len(bookings) > limit else None
+        )
+        self.logger.debug("Listed %d bookings", min(len(bookings), limit))
+        return bookings[:limit], next_cursor
+
     # Example of how to use the other service APIs (you'll need to adapt these)
     def get_user_details(self, cid: UUID):
         try:
@@ -95,11 +152,23 @@ class BookingService:
             self.logger.error(f"Error fetching technician details: {e}")
             return None
 
-    def get_service_details(self, sid: UUID):
-        try:
-            response = requests.get(f"{self.service_service_url}/{str(sid)}")
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"Error fetching service details: {e}")
-            return None
+    def get_service_details(self, sid: int):
+        service = self.service_catalog.get(sid)
+        if service is None:
+            self.logger.error(f"Error fetching service details: {sid} not found")
+        return service
+
+
+def encode_cursor(booking: Booking) -> str:
+    """Opaque cursor of the page after `booking`."""
+    position = [booking.booking_date.isoformat(), str(booking.BID)]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Returns the (booking_date, BID) of a cursor. Raises ValueError if it is invalid."""
+    try:
+        booking_date, BID = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(booking_date), UUID(BID)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
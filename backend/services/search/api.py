@@ -1,6 +1,9 @@
-from flask import Flask, jsonify, request
+import math
+
+from flask import Flask, Response, jsonify, request
 from omegaconf import DictConfig
-from services.search.services import SearchService
+from services.search.services import PRICE, RELEVANCE, SearchService
+from services.service.services import create_service_catalog
 
 from shared.utils import get_logger, with_hydra_config
 
@@ -20,27 +23,107 @@ def get_service_by_sid(sid):
 
 @app.route("/service/category/<string:category>", methods=["GET"])
 def get_services_by_category(category):
-    services = search_service.get_services_by_category(category)
-    if services:
-        return jsonify(services), 200
+    """Services of a category, matched case-insensitively (e.g. "plumbing services")."""
+    try:
+        body = search_service.get_category_response(category)
+    except ValueError:
+        logger.error(f"Invalid service category: {category}")
+        return jsonify({"error": "Invalid service category"}), 400
+    if body:
+        return Response(body, status=200, mimetype="application/json")
     return jsonify({"error": "No services found for this category"}), 404
 
 
 @app.route("/service/search", methods=["GET"])
 def search_services():
+    """
+    Ranked, typo tolerant search (e.g. "plumbr" or "frige").
+
+    Query parameters:
+        - 'name': The search term, every service when empty.
+        - 'limit' (optional): The maximum number of services to return.
+        - 'offset' (optional): The number of best results to skip.
+        - 'min_price', 'max_price' (optional): Range of the lowest price of a service, in rupees.
+        - 'sort' (optional): "relevance" (default) or "price", cheapest first.
+    """
     search_term = request.args.get("name", "")
-    services = search_service.search_services_by_name(search_term)
-    if services:
-        return jsonify(services), 200
+    limit = request.args.get("limit")
+    offset = request.args.get("offset", 0)
+    try:
+        limit = int(limit) if limit is not None else None
+        offset = int(offset)
+    except ValueError:
+        return jsonify({"error": "Invalid limit or offset values"}), 400
+    if (limit is not None and limit <= 0) or offset < 0:
+        return jsonify({"error": "Invalid limit or offset values"}), 400
+
+    min_price = request.args.get("min_price")
+    max_price = request.args.get("max_price")
+    try:
+        min_price = float(min_price) if min_price is not None else None
+        max_price = float(max_price) if max_price is not None else None
+    except ValueError:
+        return jsonify({"error": "Invalid min_price or max_price values"}), 400
+    if any(p is not None and not math.isfinite(p) for p in (min_price, max_price)):
+        return jsonify({"error": "Invalid min_price or max_price values"}), 400
+
+    sort = request.args.get("sort", RELEVANCE)
+    if sort not in (RELEVANCE, PRICE):
+        return jsonify({"error": "Invalid sort value"}), 400
+
+    body = search_service.search_services_json(
+        search_term, limit, offset, min_price, max_price, sort
+    )
+    if body:
+        return Response(body, status=200, mimetype="application/json")
     return jsonify({"error": "No services found matching the search term"}), 404
 
 
+@app.route("/service/search/cache", methods=["GET"])
+def search_cache_stats():
+    """Hit and miss counts of the search result cache."""
+    return jsonify(search_service.result_cache.stats()), 200
+
+
+@app.route("/service/suggest", methods=["GET"])
+def suggest():
+    """
+    Autocomplete for the search box, most popular first.
+
+    Query parameters:
+        - 'q': The text typed so far.
+        - 'limit' (optional): The maximum number of suggestions to return.
+    """
+    prefix = request.args.get("q", "")
+    limit = request.args.get("limit")
+    try:
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return jsonify({"error": "Invalid limit value"}), 400
+    if limit is not None and limit <= 0:
+        return jsonify({"error": "Invalid limit value"}), 400
+
+    return jsonify(search_service.suggest(prefix, limit)), 200
+
+
 @with_hydra_config
 def main(cfg: DictConfig):
     global search_service
 
-    search_service = SearchService(cfg.search.db_file)
+    search_service = SearchService(
+        create_service_catalog(cfg, cfg.search.db_file),
+        field_weights=cfg.search.ranking.field_weights,
+        min_similarity=cfg.search.ranking.min_similarity,
+        min_score=cfg.search.ranking.min_score,
+        refresh_interval_s=cfg.search.refresh_interval_s,
+        suggest_k=cfg.search.suggest.k,
+        result_cache_size=cfg.search.result_cache_size,
+        synonyms=cfg.search.ranking.synonyms,
+    )
+
+    logger.info("Starting Flask server...")
+    app.run(**cfg.search.server)
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    main()
@@ -0,0 +1,266 @@
+import heapq
+import re
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+class SubstringIndex:
+    """
+    Case-insensitive substring search over short texts (e.g. service names).
+
+    Texts are split into whitespace separated tokens with a posting list of
+    the texts containing each one. Every suffix of every distinct token is
+    kept in one sorted array: a query term is a substring of a token exactly
+    when it is a prefix of one of its suffixes, so the tokens containing a
+    term are found by bisecting the array. A multi-word query intersects the
+    texts of its terms and then checks the whole query against the remaining
+    texts, so results are the same as `query in text`.
+    """
+
+    def __init__(self, texts: List[str]):
+        self.texts = [text.lower() for text in texts]
+
+        postings: Dict[str, List[int]] = {}  # token: [text position]
+        for doc, text in enumerate(self.texts):
+            for token in set(text.split()):
+                postings.setdefault(token, []).append(doc)
+        self._postings = {
+            token: np.asarray(docs, dtype=np.int64) for token, docs in postings.items()
+        }
+
+        entries = sorted(
+            (token[i:], token) for token in self._postings for i in range(len(token))
+        )
+        self._suffixes = [suffix for suffix, _ in entries]
+        self._tokens = [token for _, token in entries]
+
+    def contains_terms(self, query: str) -> np.ndarray:
+        """
+        Returns a mask of the texts having every whitespace separated term of
+        `query` (lowercased) in one of their tokens.
+        """
+        mask = None
+        for term in sorted(set(query.split()), key=len, reverse=True):
+            lo = bisect_left(self._suffixes, term)
+            hi = bisect_right(self._suffixes, term + "\U0010ffff", lo)
+            matches = np.zeros(len(self.texts), dtype=bool)
+            for token in set(self._tokens[lo:hi]):
+                matches[self._postings[token]] = True
+            mask = matches if mask is None else mask & matches
+            if not mask.any():
+                break
+        return mask if mask is not None else np.zeros(len(self.texts), dtype=bool)
+
+    def search(self, query: str) -> List[int]:
+        """Returns the positions of the texts containing `query`, in their original order."""
+        query = query.lower()
+        terms = query.split()
+        if not terms:
+            # Empty or whitespace-only query, nothing to look up
+            return [doc for doc, text in enumerate(self.texts) if query in text]
+
+        docs = np.flatnonzero(self.contains_terms(query)).tolist()
+        if len(terms) > 1 or query != terms[0]:
+            docs = [doc for doc in docs if query in self.texts[doc]]
+        return docs
+
+
+def trigrams(word: str) -> Set[str]:
+    """Trigrams of a word padded with two spaces in front and one after."""
+    padded = f"  {word} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    Typo tolerant scoring of documents made of weighted text fields.
+
+    The words of every field form one vocabulary indexed by trigram. A query
+    word matches the vocabulary words whose trigram similarity (shared over
+    distinct trigrams of both, as in pg_trgm) is at least `min_similarity`,
+    found with one `np.bincount` over the postings of its trigrams. In each
+    field a document scores the average over the query words of their best
+    match among its words, and its score is the sum of the field scores
+    times the field weights.
+    """
+
+    def __init__(
+        self,
+        documents: List[Dict[str, str]],
+        weights: Dict[str, float],
+        min_similarity: float = 0.3,
+    ):
+        self.size = len(documents)
+        self.weights = weights
+        self.min_similarity = min_similarity
+
+        self._word_ids: Dict[str, int] = {}
+        postings: Dict[str, Dict[int, List[int]]] = {field: {} for field in weights}
+        for doc, fields in enumerate(documents):
+            for field, text in fields.items():
+                field_postings = postings[field]
+                for word in set(WORD_RE.findall(text.lower())):
+                    word_id = self._word_ids.setdefault(word, len(self._word_ids))
+                    field_postings.setdefault(word_id, []).append(doc)
+        # field: {word id: [doc]}
+        self._postings = {
+            field: {
+                word_id: np.asarray(docs, dtype=np.int64)
+                for word_id, docs in field_postings.items()
+            }
+            for field, field_postings in postings.items()
+        }
+
+        gram_ids: Dict[str, int] = {}
+        grams, words = [], []
+        for word, word_id in self._word_ids.items():
+            for gram in trigrams(word):
+                grams.append(gram_ids.setdefault(gram, len(gram_ids)))
+                words.append(word_id)
+        self._gram_ids = gram_ids
+
+        grams = np.asarray(grams, dtype=np.int64)
+        order = np.argsort(grams, kind="stable")
+        self._gram_words = np.asarray(words, dtype=np.int64)[order]
+        self._gram_offsets = np.searchsorted(grams[order], np.arange(len(gram_ids) + 1))
+        self._word_gram_counts = np.bincount(words, minlength=len(self._word_ids))
+
+    def similar_words(self, word: str) -> List[Tuple[int, float]]:
+        """Returns (word id, similarity) of the vocabulary words similar to `word`, least similar first."""
+        query_grams = trigrams(word)
+        gram_ids = [self._gram_ids[g] for g in query_grams if g in self._gram_ids]
+        if not gram_ids:
+            return []
+
+        words = np.concatenate(
+            [
+                self._gram_words[self._gram_offsets[g] : self._gram_offsets[g + 1]]
+                for g in gram_ids
+            ]
+        )
+        shared = np.bincount(words, minlength=len(self._word_ids))
+        similarity = shared / (len(query_grams) + self._word_gram_counts - shared)
+        matches = np.flatnonzero(similarity >= self.min_similarity)
+        matches = matches[np.argsort(similarity[matches], kind="stable")]
+        return list(zip(matches.tolist(), similarity[matches].tolist()))
+
+    def scores(self, query: str) -> np.ndarray:
+        """Returns the score of every document for `query`."""
+        scores = np.zeros(self.size)
+        words = list(dict.fromkeys(WORD_RE.findall(query.lower())))
+        for word in words:
+            matches = self.similar_words(word)
+            for field, weight in self.weights.items():
+                postings = self._postings[field]
+                field_matches = [(w, s) for w, s in matches if w in postings]
+                factor = weight / len(words)
+                if len(field_matches) == 1:
+                    word_id, similarity = field_matches[0]
+                    scores[postings[word_id]] += similarity * factor
+                elif field_matches:
+                    best = np.zeros(self.size)
+                    for word_id, similarity in field_matches:
+                        # Least similar first, so each document keeps its best match
+                        best[postings[word_id]] = similarity
+                    best *= factor
+                    scores += best
+        return scores
+
+
+class PrefixSuggester:
+    """
+    Autocomplete over texts (e.g. service names and categories) by popularity.
+
+    Keys are each lowercased text and its rest from every word start, kept
+    in one sorted array, so the keys under a prefix are a range found by
+    bisection. The best `k` texts are precomputed for every prefix whose
+    range holds more than `scan_limit` keys (the nodes of a trie over the
+    keys, pruned where they get small). Other prefixes rank their few keys
+    directly.
+    """
+
+    def __init__(
+        self, entries: List[Tuple[str, float]], k: int = 10, scan_limit: int = 64
+    ):
+        self.k = k
+        self.scan_limit = scan_limit
+
+        # Entries are referred to by rank: most popular first, then alphabetical
+        self.order = sorted(
+            range(len(entries)), key=lambda i: (-entries[i][1], entries[i][0].lower())
+        )
+        keys = sorted(
+            {
+                (text[start:], rank)
+                for rank, entry in enumerate(self.order)
+                for text in [" ".join(entries[entry][0].lower().split())]
+                for start in word_starts(text)
+            }
+        )
+        self._keys = [key for key, _ in keys]
+        self._ranks = np.asarray([rank for _, rank in keys], dtype=np.int64)
+
+        self._top: Dict[str, List[int]] = {}  # prefix: best ranks
+        nodes = [("", 0, len(self._keys))]
+        while nodes:
+            prefix, lo, hi = nodes.pop()
+            self._top[prefix] = np.unique(self._ranks[lo:hi])[:k].tolist()
+
+            depth, start = len(prefix), lo
+            while start < hi:
+                if len(self._keys[start]) == depth:  # the prefix itself
+                    start += 1
+                    continue
+                child = prefix + self._keys[start][depth]
+                end = bisect_right(self._keys, child + "\U0010ffff", start, hi)
+                if end - start > scan_limit:
+                    nodes.append((child, start, end))
+                start = end
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        lo = bisect_left(self._keys, prefix)
+        return lo, bisect_right(self._keys, prefix + "\U0010ffff", lo)
+
+    def suggest(self, prefix: str, limit: Optional[int] = None) -> List[int]:
+        """Returns the positions of the best entries with a word starting with `prefix`."""
+        limit = self.k if limit is None else min(limit, self.k)
+        prefix = " ".join(prefix.lower().split())
+
+        ranks = self._top.get(prefix)
+        if ranks is None:
+            lo, hi = self._range(prefix)
+            ranks = heapq.nsmallest(limit, set(self._ranks[lo:hi].tolist()))
+        return [self.order[rank] for rank in ranks[:limit]]
+
+
+class PriceIndex:
+    """
+    Services sorted by their lowest price, so the ones in a price range are
+    found by bisection. Services without a price (NaN) sort last and are
+    never in a range.
+    """
+
+    def __init__(self, prices: np.ndarray):
+        self.prices = np.where(np.isnan(prices), np.inf, prices)
+        self.order = np.argsort(self.prices, kind="stable")
+        self._sorted = self.prices[self.order]
+
+    def between(
+        self, low: Optional[float] = None, high: Optional[float] = None
+    ) -> np.ndarray:
+        """Returns the positions of the services priced in [low, high], cheapest first."""
+        lo = 0 if low is None else np.searchsorted(self._sorted, low, side="left")
+        if high is None:
+            hi = np.searchsorted(self._sorted, np.inf, side="left")
+        else:
+            hi = np.searchsorted(self._sorted, high, side="right")
+        return self.order[lo:hi]
+
+
+def word_starts(text: str) -> List[int]:
+    """Positions in `text` where a word starts."""
+    return [match.start() for match in WORD_RE.finditer(text)] or [0]
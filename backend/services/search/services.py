@@ -1,27 +1,403 @@
 import json
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from services.search.index import (
+    PriceIndex,
+    PrefixSuggester,
+    SubstringIndex,
+    TrigramIndex,
+)
+from services.service.services import DatabaseServiceCatalog, ServiceCatalog
+from shared.cache import LRUCache
+from shared.enums import ServiceCategory
+
+# Relevance of a query matching (the trigrams of) each field
+FIELD_WEIGHTS = {"name": 1.0, "category": 0.8, "claims": 0.3}
+# Added to services whose name contains every term of the query as is, so they rank first
+EXACT_MATCH_BONUS = 1.0
+# Words and phrases customers use for what the catalog names otherwise. A query
+# is also searched with these replaced, keeping the best score of a service.
+SYNONYMS = {
+    "aircon": "ac",
+    "air conditioner": "ac",
+    "air conditioning": "ac",
+    "fridge": "refrigerator",
+    "plumber": "plumbing",
+    "electrician": "electrical",
+    "washer": "washing machine",
+    "ro": "water purifier",
+    "oven": "microwave",
+}
+
+# Orders of search results
+RELEVANCE = "relevance"
+PRICE = "price"
+
+# The amount of a display price such as "₹1,798 (₹899/AC) - 10% off"
+PRICE_RE = re.compile(r"₹\s*(\d[\d,]*(?:\.\d+)?)")
+# Details that mention amounts without being a price of the service
+NON_PRICE_DETAILS = ("claims", "duration")
+
+_MISSING = object()
+
+_CATEGORIES = {category.value.lower(): category for category in ServiceCategory}
+
+
+def parse_category(category: str) -> ServiceCategory:
+    """Converts a category name, in any case, to the ServiceCategory enum."""
+    try:
+        return _CATEGORIES[category.strip().lower()]
+    except KeyError:
+        raise ValueError(f"Invalid value for ServiceCategory: {category}") from None
+
+
+def synonyms_pattern(synonyms: Dict[str, str]) -> Optional["re.Pattern"]:
+    """Matches any of the (lowercase) synonyms as whole words, longest first."""
+    if not synonyms:
+        return None
+    phrases = sorted(synonyms, key=len, reverse=True)
+    return re.compile(r"\b(?:" + "|".join(map(re.escape, phrases)) + r")\b")
+
+
+def search_fields(service: dict) -> Dict[str, str]:
+    """The texts of a service matched by fuzzy search."""
+    details = service.get("details") or {}
+    return {
+        "name": service.get("serviceName", ""),
+        "category": service.get("serviceCategory", ""),
+        "claims": " ".join(details.get("claims", [])),
+    }
+
+
+def parse_price(text: str) -> Optional[float]:
+    """Returns the first amount in rupees of a display price, or None."""
+    match = PRICE_RE.search(text)
+    return float(match.group(1).replace(",", "")) if match else None
+
+
+def price_range(details: dict) -> Optional[Tuple[float, float]]:
+    """
+    Returns the (min, max) price of a service, or None if it has no price.
+
+    Prices are taken from "price", from the variants of a "prices" map, and
+    from the variants listed directly in the details, e.g.
+    {"upto 500L": "₹499", "500L-2000L": "₹1049"} or {"wall": {"price": "₹99"}}.
+    """
+    prices = []
+    pending = [v for k, v in details.items() if k not in NON_PRICE_DETAILS]
+    while pending:
+        value = pending.pop()
+        if isinstance(value, str):
+            price = parse_price(value)
+            if price is not None:
+                prices.append(price)
+        elif isinstance(value, dict):
+            pending.extend(value.values())
+    return (min(prices), max(prices)) if prices else None
+
+
+def with_price_range(service: dict) -> dict:
+    """Returns a copy of a service with its "minPrice" and "maxPrice", if it has a price."""
+    prices = price_range(service.get("details") or {})
+    if prices is None:
+        return service
+    return {**service, "minPrice": prices[0], "maxPrice": prices[1]}
+
+
+@dataclass(frozen=True)
+class SearchState:
+    """
+    The services of one catalog version with everything derived from them.
+
+    Built whole by `SearchService.refresh` and published with one assignment,
+    so a request that took a state uses indexes and services that match.
+    """
+
+    version: object
+    services: List[dict]
+    name_index: SubstringIndex
+    fuzzy_index: TrigramIndex
+    price_index: PriceIndex
+    by_sid: Dict[int, dict]
+    by_category: Dict[ServiceCategory, List[dict]]
+    category_responses: Dict[ServiceCategory, bytes]  # JSON of by_category
+    suggester: PrefixSuggester
+    suggestions: List[dict]  # payloads of the suggester entries
 
 
 class SearchService:
-    def __init__(self, json_file):
-        with open(json_file, "r") as file:
-            self.data = json.load(file)
+    def __init__(
+        self,
+        catalog: Union[ServiceCatalog, DatabaseServiceCatalog],
+        field_weights: Optional[Dict[str, float]] = None,
+        min_similarity: float = 0.3,
+        min_score: float = 0.3,
+        refresh_interval_s: float = 1.0,
+        suggest_k: int = 10,
+        result_cache_size: int = 1024,
+        synonyms: Optional[Dict[str, str]] = None,
+    ):
+        self.catalog = catalog
+        self.field_weights = dict(field_weights or FIELD_WEIGHTS)
+        self.synonyms = {
+            " ".join(k.lower().split()): v.lower()
+            for k, v in (SYNONYMS if synonyms is None else synonyms).items()
+        }
+        self._synonyms_re = synonyms_pattern(self.synonyms)
+        self.min_similarity = min_similarity
+        self.min_score = min_score
+        self.refresh_interval_s = refresh_interval_s
+        self.suggest_k = suggest_k
+        # Serialized search results by (catalog version, normalized query and parameters)
+        self.result_cache = LRUCache(result_cache_size)
+
+        self.checked_at = time.monotonic()  # monotonic time of the last version check
+        # One thread checks and rebuilds at a time
+        self._refresh_lock = threading.Lock()
+        version = self.catalog.version()
+        self.state = self._build_state(version, self.catalog.all())
+
+    def refresh(self) -> SearchState:
+        """
+        Reloads the services if the catalog changed since they were loaded.
+
+        Returns the current state. While one request checks the catalog or
+        rebuilds the indexes, the others keep using the previous state.
+        """
+        if time.monotonic() - self.checked_at < self.refresh_interval_s:
+            return self.state
+        if not self._refresh_lock.acquire(blocking=False):
+            return self.state
+        try:
+            if time.monotonic() - self.checked_at >= self.refresh_interval_s:
+                version = self.catalog.version()
+                if version != self.state.version:
+                    self.state = self._build_state(version, self.catalog.all())
+                    self.result_cache.clear()
+                self.checked_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+        return self.state
+
+    def _build_state(self, version, services: List[dict]) -> SearchState:
+        services = [with_price_range(service) for service in services]
+
+        by_category: Dict[ServiceCategory, List[dict]] = {}
+        for service in services:
+            category = _CATEGORIES.get(service.get("serviceCategory", "").lower())
+            if category is not None:
+                by_category.setdefault(category, []).append(service)
+
+        suggester, suggestions = self._build_suggester(services)
+        return SearchState(
+            version=version,
+            services=services,
+            name_index=SubstringIndex(
+                [service.get("serviceName", "") for service in services]
+            ),
+            fuzzy_index=TrigramIndex(
+                [search_fields(service) for service in services],
+                self.field_weights,
+                self.min_similarity,
+            ),
+            price_index=PriceIndex(
+                np.array([service.get("minPrice", np.nan) for service in services])
+            ),
+            by_sid={service["SID"]: service for service in services},
+            by_category=by_category,
+            category_responses={
+                category: json.dumps(members, sort_keys=True).encode()
+                for category, members in by_category.items()
+            },
+            suggester=suggester,
+            suggestions=suggestions,
+        )
+
+    def _build_suggester(
+        self, services: List[dict]
+    ) -> Tuple[PrefixSuggester, List[dict]]:
+        """Indexes service names and categories, ranked by (summed) popularity."""
+        suggestions: List[dict] = []
+        entries = []
+        category_popularity: Dict[str, float] = {}
+        for service in services:
+            popularity = service.get("popularity", 0)
+            category = service.get("serviceCategory")
+            if category:
+                category_popularity[category] = (
+                    category_popularity.get(category, 0) + popularity
+                )
+            if service.get("serviceName"):
+                entries.append((service["serviceName"], popularity))
+                suggestions.append(
+                    {
+                        "text": service["serviceName"],
+                        "type": "service",
+                        "SID": service["SID"],
+                    }
+                )
+        for category, popularity in category_popularity.items():
+            entries.append((category, popularity))
+            suggestions.append({"text": category, "type": "category"})
+        return PrefixSuggester(entries, k=self.suggest_k), suggestions
+
+    def expand_synonyms(self, query: str) -> str:
+        """The query, lowercased, with its synonyms replaced by the catalog's terms."""
+        query = " ".join(query.lower().split())
+        if self._synonyms_re is None:
+            return query
+        return self._synonyms_re.sub(lambda m: self.synonyms[m.group(0)], query)
 
     def get_service_by_sid(self, sid):
-        for service in self.data["services"]:
-            if service["SID"] == sid:
-                return service
-        return None
+        return self.refresh().by_sid.get(sid)
 
     def get_services_by_category(self, category):
-        return [
-            service
-            for service in self.data["services"]
-            if service["serviceCategory"] == category
-        ]
+        """Raises ValueError if `category` is not a ServiceCategory (in any case)."""
+        return self.refresh().by_category.get(parse_category(category), [])
+
+    def get_category_response(self, category) -> Optional[bytes]:
+        """
+        The services of a category as a JSON array, serialized when the
+        catalog was loaded. None if the category has no services, raises
+        ValueError if it is not a ServiceCategory.
+        """
+        return self.refresh().category_responses.get(parse_category(category))
 
     def search_services_by_name(self, search_term):
-        return [
-            service
-            for service in self.data["services"]
-            if search_term.lower() in service["serviceName"].lower()
-        ]
+        state = self.refresh()
+        return [state.services[i] for i in state.name_index.search(search_term)]
+
+    def search_services(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort: str = RELEVANCE,
+    ) -> List[dict]:
+        """
+        Ranked, typo tolerant search over service names, categories and claims.
+
+        Services whose name contains every term of the query come first, then
+        the others scoring at least `min_score`, best first. An empty query returns every
+        service in catalog order. A query using `synonyms` (e.g. "aircon") is
+        also matched with the catalog's terms (e.g. "ac").
+
+        With `min_price` or `max_price` only services whose lowest price is in
+        that range are returned. `sort=PRICE` orders results by lowest price
+        (best match first among equal prices), services without a price last.
+        """
+        return self._search(
+            self.refresh(), query, limit, offset, min_price, max_price, sort
+        )
+
+    def _search(
+        self,
+        state: SearchState,
+        query: str,
+        limit: Optional[int],
+        offset: int,
+        min_price: Optional[float],
+        max_price: Optional[float],
+        sort: str,
+    ) -> List[dict]:
+        services = state.services
+
+        priced = None  # positions of the services in the price range, cheapest first
+        if min_price is not None or max_price is not None:
+            priced = state.price_index.between(min_price, max_price)
+
+        if not query.strip():
+            if sort == PRICE:
+                ranked = state.price_index.order if priced is None else priced
+            else:
+                ranked = np.arange(len(services)) if priced is None else np.sort(priced)
+        else:
+            scores = self._scores(state, query.lower())
+            expanded = self.expand_synonyms(query)
+            if expanded != " ".join(query.lower().split()):
+                np.maximum(scores, self._scores(state, expanded), out=scores)
+            matches = scores >= self.min_score
+            if priced is not None:
+                in_range = np.zeros(len(services), dtype=bool)
+                in_range[priced] = True
+                matches &= in_range
+            hits = np.flatnonzero(matches)
+            hit_scores = scores[hits]
+
+            if sort == PRICE:
+                prices = state.price_index.prices[hits]
+                ranked = hits[np.lexsort((-hit_scores, prices))]
+            else:
+                end = len(hits) if limit is None else offset + limit
+                if end < len(hits):
+                    # Only the first `end` results need to be sorted: those above the
+                    # end-th best score, then the first ones at that score
+                    kth = -np.partition(-hit_scores, end - 1)[end - 1]
+                    above = hit_scores > kth
+                    tied = np.flatnonzero(hit_scores == kth)[: end - above.sum()]
+                    hits = np.concatenate([hits[above], hits[tied]])
+                    hit_scores = scores[hits]
+                # Stable, so ties keep catalog order and pages do not overlap
+                ranked = hits[np.argsort(-hit_scores, kind="stable")]
+
+        end = None if limit is None else offset + limit
+        return [services[i] for i in ranked[offset:end]]
+
+    def _scores(self, state: SearchState, query: str) -> np.ndarray:
+        """Fuzzy scores of a lowercase query, plus the bonus for exact name matches."""
+        scores = state.fuzzy_index.scores(query)
+        exact = state.name_index.contains_terms(query)
+        np.add(scores, EXACT_MATCH_BONUS, out=scores, where=exact)
+        return scores
+
+    def search_services_json(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort: str = RELEVANCE,
+    ) -> Optional[bytes]:
+        """
+        `search_services` serialized to a JSON array, None when nothing matches.
+
+        Responses are cached by query (lowercased, whitespace collapsed) and
+        parameters, along with the version of the state they were computed
+        from, so a response is never served for another version. The cache is
+        emptied whenever the services are reloaded.
+        """
+        state = self.refresh()
+        key = (
+            state.version,
+            " ".join(query.lower().split()),
+            limit,
+            offset,
+            min_price,
+            max_price,
+            sort,
+        )
+        body = self.result_cache.get(key, _MISSING)
+        if body is _MISSING:
+            services = self._search(
+                state, query, limit, offset, min_price, max_price, sort
+            )
+            body = json.dumps(services, sort_keys=True).encode() if services else None
+            self.result_cache.put(key, body)
+        return body
+
+    def suggest(self, prefix: str, limit: Optional[int] = None) -> List[dict]:
+        """
+        Autocomplete: the most popular service names and categories having a
+        word that starts with `prefix`.
+        """
+        state = self.refresh()
+        return [state.suggestions[i] for i in state.suggester.suggest(prefix, limit)]
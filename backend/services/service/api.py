@@ -1,34 +1,48 @@
-import json
+import threading
+from typing import List, Union
 from flask import Flask, request, jsonify
 from omegaconf import DictConfig
+import requests
 from dotenv import load_dotenv
 
-from shared.utils import with_hydra_config, get_logger
+from services.service.import_catalog import import_catalog
+from services.service.services import (
+    DatabaseServiceCatalog,
+    ServiceCatalog,
+    create_service_catalog,
+)
+from shared.utils import with_hydra_config, get_logger, get_device_ip
 
 load_dotenv()
 
 app = Flask(__name__)
 logger = get_logger("service")
 
-DATA_FILE = "database/services.json"
+# The service_catalog table, or services.json with its journal (service.catalog.backend)
+catalog: Union[ServiceCatalog, DatabaseServiceCatalog]
+
+# /catalog/invalidate endpoints of the services caching the catalog
+catalog_subscribers: List[str] = []
+notify_timeout_s: float = 2.0
 
 
 def load_services():
-    """Loads services from the JSON file."""
-    try:
-        with open(DATA_FILE, "r") as file:
-            data = json.load(file)
-            return data["services"]
-    except FileNotFoundError:
-        return []
-    except json.JSONDecodeError:
-        return []
+    """Loads services from the catalog."""
+    return catalog.all()
+
 
+def notify_catalog_change(sid: int):
+    """Tells the services caching the catalog that a service changed, in the background."""
 
-def save_services(services):
-    """Saves services to the JSON file."""
-    with open(DATA_FILE, "w") as file:
-        json.dump({"services": services}, file, indent=4)
+    def notify():
+        for url in catalog_subscribers:
+            try:
+                requests.post(url, json={"sid": sid}, timeout=notify_timeout_s)
+            except requests.exceptions.RequestException as e:
+                # Their copy expires after its TTL anyway
+                logger.warning(f"Error notifying {url} of catalog change: {str(e)}")
+
+    threading.Thread(target=notify, daemon=True).start()
 
 
 @app.route("/services", methods=["POST"])
@@ -36,12 +50,8 @@ def create_service():
     """Creates a new service."""
     logger.info(f"Received {request.method} request to /services")
     try:
-        service_data = request.get_json()
-        services = load_services()
-        new_sid = max((s["SID"] for s in services), default=0) + 1
-        service_data["SID"] = new_sid
-        services.append(service_data)
-        save_services(services)
+        service_data = catalog.create(request.get_json())
+        notify_catalog_change(service_data["SID"])
         return jsonify(service_data), 201
     except Exception as e:
         logger.error(f"Error creating service: {str(e)}")
@@ -52,8 +62,7 @@ def create_service():
 def get_service(sid: int):
     """Retrieves a specific service by ID."""
     logger.info(f"Received {request.method} request to /services/{sid}")
-    services = load_services()
-    service = next((s for s in services if s["SID"] == sid), None)
+    service = catalog.get(sid)
     if service:
         return jsonify(service), 200
     else:
@@ -62,8 +71,11 @@ def get_service(sid: int):
 
 @app.route("/services", methods=["GET"])
 def get_all_services():
-    """Retrieves all services."""
+    """Retrieves all services, or those of the `category` query parameter."""
     logger.info(f"Received {request.method} request to /services")
+    category = request.args.get("category")
+    if category is not None:
+        return jsonify(catalog.in_category(category)), 200
     services = load_services()
     return jsonify(services), 200
 
@@ -73,13 +85,10 @@ def update_service(sid: int):
     """Updates an existing service."""
     logger.info(f"Received {request.method} request to /services/{sid}")
     try:
-        update_data = request.get_json()
-        services = load_services()
-        for i, service in enumerate(services):
-            if service["SID"] == sid:
-                services[i] = {**service, **update_data}
-                save_services(services)
-                return jsonify(services[i]), 200
+        service = catalog.update(sid, request.get_json())
+        if service:
+            notify_catalog_change(sid)
+            return jsonify(service), 200
         return jsonify({"error": "Service not found or update failed"}), 404
     except Exception as e:
         logger.error(f"Error updating service: {str(e)}")
@@ -90,15 +99,28 @@ def update_service(sid: int):
 def delete_service(sid: int):
     """Deletes a service."""
     logger.info(f"Received {request.method} request to /services/{sid}")
-    services = load_services()
-    services = [s for s in services if s["SID"] != sid]
-    save_services(services)
+    if catalog.delete(sid):
+        notify_catalog_change(sid)
     return jsonify({"message": "Service deleted successfully"}), 200
 
 
 @with_hydra_config
 def main(cfg: DictConfig):
     """Main function to start the Flask server."""
+    global catalog, catalog_subscribers, notify_timeout_s
+
+    catalog = create_service_catalog(cfg, cfg.service.catalog.data_file)
+    if isinstance(catalog, DatabaseServiceCatalog) and catalog.version() == 0:
+        # First start on this database, seed it from the JSON catalog
+        import_catalog(catalog, cfg.service.catalog.data_file)
+
+    ip_addr = get_device_ip()
+    catalog_subscribers = [
+        f"http://{ip_addr}:{cfg.app.server.port}/catalog/invalidate",
+        f"http://{ip_addr}:{cfg.booking.server.port}/catalog/invalidate",
+    ]
+    notify_timeout_s = cfg.service.catalog.notify_timeout_s
+
     logger.info("Starting Flask server...")
     app.run(**cfg.service.server)
 
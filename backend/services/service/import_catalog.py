@@ -0,0 +1,30 @@
+"""
+Imports database/services.json (with its journal) into the service_catalog table.
+
+Usage (from the backend directory):
+    python -m services.service.import_catalog
+"""
+
+from omegaconf import DictConfig
+
+from services.service.services import DatabaseServiceCatalog, ServiceCatalog
+from shared.utils import with_hydra_config, get_logger
+
+logger = get_logger("service")
+
+
+def import_catalog(catalog: DatabaseServiceCatalog, data_file: str) -> int:
+    """Replaces the services in the database with those of the JSON catalog. Returns their count."""
+    services = ServiceCatalog(data_file).all()
+    catalog.replace_all(services)
+    logger.info(f"Imported {len(services)} services from {data_file}")
+    return len(services)
+
+
+@with_hydra_config
+def main(cfg: DictConfig):
+    import_catalog(DatabaseServiceCatalog(cfg.database), cfg.service.catalog.data_file)
+
+
+if __name__ == "__main__":
+    main()
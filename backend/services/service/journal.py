@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+class FileLock:
+    """
+    Advisory lock on a file, shared by every worker using the catalog.
+
+    Uses flock where available (shared or exclusive), msvcrt on Windows
+    (always exclusive), and only serializes the threads of this process
+    when neither exists. Not re-entrant.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.Lock()  # flock does not exclude threads sharing a lock
+
+    @contextmanager
+    def acquire(self, shared: bool = False):
+        with self._local, open(self.path, "a+") as file:
+            if fcntl:
+                fcntl.flock(file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            elif msvcrt:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+                elif msvcrt:
+                    file.seek(0)
+                    msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class Journal:
+    """
+    Append-only file of JSON records, one per line.
+
+    Appends are flushed to the OS right away and fsynced in groups: the first
+    append after a sync schedules one fsync `fsync_interval_s` later covering
+    every append made in between (0 fsyncs each append). Callers serialize
+    appends and `reset` with a FileLock.
+    """
+
+    def __init__(self, path: str, fsync_interval_s: float = 0.05):
+        self.path = path
+        self.fsync_interval_s = fsync_interval_s
+
+        self._file = None  # opened on the first append
+        self._sync_timer = None
+        self._lock = threading.Lock()
+
+    def stat(self) -> Tuple[int, int]:
+        """Returns the (inode, size) of the journal file, (0, 0) if it does not exist."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return 0, 0
+        return st.st_ino, st.st_size
+
+    def append(self, record: dict) -> int:
+        """Appends a record. Returns the number of bytes written."""
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+        with self._lock:
+            # Reopen if another worker replaced the file while compacting
+            if (
+                self._file is None
+                or os.fstat(self._file.fileno()).st_ino != self.stat()[0]
+            ):
+                self._close()
+                self._file = open(self.path, "ab")
+            self._file.write(line)
+            self._file.flush()
+
+            if self.fsync_interval_s <= 0:
+                os.fsync(self._file.fileno())
+            elif self._sync_timer is None:
+                self._sync_timer = threading.Timer(self.fsync_interval_s, self.sync)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+        return len(line)
+
+    def sync(self):
+        """Fsyncs the appends made so far."""
+        with self._lock:
+            self._sync_timer = None
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+
+    def read(self, offset: int = 0) -> Tuple[List[dict], int]:
+        """
+        Reads the complete records after `offset`.
+
+        Returns:
+            The records and the offset following the last one. A trailing
+            line still being written is left for the next read.
+        """
+        try:
+            with open(self.path, "rb") as file:
+                file.seek(offset)
+                data = file.read()
+        except FileNotFoundError:
+            return [], 0
+
+        end = data.rfind(b"\n") + 1
+        records = [json.loads(line) for line in data[:end].splitlines() if line]
+        return records, offset + end
+
+    def truncate(self, size: int):
+        """Cuts the journal to `size` bytes, e.g. to drop a record torn by a crash."""
+        os.truncate(self.path, size)
+
+    def reset(self):
+        """Atomically replaces the journal with an empty one."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as file:
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,47 @@
+from sqlalchemy import Column, Integer, String, JSON
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+# Top-level keys of a service with their own column, everything else is kept in `extra`
+COLUMN_KEYS = ("SID", "serviceCategory", "serviceName", "details")
+
+
+class CatalogService(Base):
+    # "services" is taken by the older schema in hot_start.sqlite3
+    __tablename__ = "service_catalog"
+
+    SID = Column(Integer, primary_key=True, autoincrement=True)
+    service_category = Column(String(50), nullable=False, index=True)
+    service_name = Column(String(255), index=True)
+    details = Column(JSON)
+    extra = Column(JSON)
+
+    @classmethod
+    def from_dict(cls, service: dict) -> "CatalogService":
+        return cls(
+            SID=service.get("SID"),
+            service_category=service.get("serviceCategory"),
+            service_name=service.get("serviceName"),
+            details=service.get("details"),
+            extra={k: v for k, v in service.items() if k not in COLUMN_KEYS} or None,
+        )
+
+    def to_dict(self):
+        service = {"SID": self.SID, "serviceCategory": self.service_category}
+        if self.service_name is not None:
+            service["serviceName"] = self.service_name
+        if self.details is not None:
+            service["details"] = self.details
+        if self.extra:
+            service.update(self.extra)
+        return service
+
+
+class CatalogVersion(Base):
+    """Single row counting the changes to the catalog, so readers know when to reload."""
+
+    __tablename__ = "service_catalog_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,374 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+from omegaconf import DictConfig
+from sqlalchemy.orm import sessionmaker
+
+from services.service.journal import FileLock, Journal
+from services.service.models import Base, CatalogService, CatalogVersion
+from shared.db import create_db_engine
+from shared.utils import get_logger
+
+PUT = "put"
+DELETE = "delete"
+
+
+def put_service(
+    by_sid: Dict[int, dict], by_category: Dict[str, Dict[int, dict]], service: dict
+):
+    """Adds or replaces a service in the indexes of a catalog."""
+    sid = service["SID"]
+    remove_service(by_sid, by_category, sid, keep_position=True)
+    by_sid[sid] = service
+    by_category.setdefault(service.get("serviceCategory"), {})[sid] = service
+
+
+def remove_service(
+    by_sid: Dict[int, dict],
+    by_category: Dict[str, Dict[int, dict]],
+    sid: int,
+    keep_position: bool = False,
+) -> bool:
+    """Removes a service from the indexes of a catalog. Returns False if it was not there."""
+    service = by_sid.get(sid)
+    if service is None:
+        return False
+    if not keep_position:
+        del by_sid[sid]
+    category = service.get("serviceCategory")
+    members = by_category[category]
+    del members[sid]
+    if not members:
+        del by_category[category]
+    return True
+
+
+class ServiceCatalog:
+    """
+    The service catalog held in memory, indexed by SID and by category.
+
+    The catalog is the JSON snapshot plus an append-only journal of the
+    changes made since (`<data_file>.journal`). A write appends one record
+    to the journal, O(1) on disk. Every `compact_every` records the snapshot
+    is rewritten to a temporary file and atomically renamed over the old
+    one, and the journal is emptied. Changes are made to copies of the in-memory
+    catalog that are then swapped in, so reads need no lock.
+
+    Writers from several workers are serialized with a lock file
+    (`<data_file>.lock`). Before each request the files are checked with
+    `stat`. Only new journal records are read, and the full catalog is
+    reloaded when the snapshot was replaced.
+    """
+
+    def __init__(
+        self,
+        data_file: str,
+        fsync_interval_s: float = 0.05,
+        compact_every: int = 1000,
+    ):
+        self.logger = get_logger("service")
+        self.data_file = data_file
+        self.compact_every = compact_every
+
+        self.journal = Journal(f"{data_file}.journal", fsync_interval_s)
+        self.file_lock = FileLock(f"{data_file}.lock")
+
+        self._by_sid: Dict[int, dict] = {}
+        self._by_category: Dict[str, Dict[int, dict]] = {}  # category: {SID: service}
+        self._max_sid = 0
+        self._version = 0  # bumped whenever the in-memory catalog changes
+
+        self._snapshot_id: Optional[Tuple[int, int, int]] = None  # (inode, mtime, size)
+        self._journal_inode = 0
+        self._journal_offset = 0  # bytes of the journal applied so far
+        self._journal_records = 0  # records applied since the snapshot
+        self._lock = threading.RLock()
+
+    def _stat_snapshot(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.data_file)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _is_current(self) -> bool:
+        return self._stat_snapshot() == self._snapshot_id and self.journal.stat() == (
+            self._journal_inode,
+            self._journal_offset,
+        )
+
+    def _refresh(self):
+        """Applies the changes made to the files since they were last read."""
+        if self._is_current():
+            return
+        with self._lock, self.file_lock.acquire(shared=True):
+            self._sync_with_files()
+
+    def _sync_with_files(self):
+        """Reads new journal records, or everything if the snapshot was replaced. Needs the file lock."""
+        snapshot_id = self._stat_snapshot()
+        journal_inode, journal_size = self.journal.stat()
+
+        if (
+            snapshot_id != self._snapshot_id
+            or journal_inode != self._journal_inode
+            or journal_size < self._journal_offset
+        ):
+            if not self._load_snapshot():
+                return  # retried on the next request
+            self._snapshot_id = snapshot_id
+            self._journal_inode = journal_inode
+            self._journal_offset = 0
+            self._journal_records = 0
+
+        records, self._journal_offset = self.journal.read(self._journal_offset)
+        self._apply(records)
+        self._journal_records += len(records)
+
+    def _load_snapshot(self) -> bool:
+        """
+        Replaces the catalog with the snapshot, built aside and swapped in so
+        readers never see it half loaded. Returns False, keeping the catalog
+        as it was, if the snapshot cannot be parsed.
+        """
+        by_sid: Dict[int, dict] = {}
+        by_category: Dict[str, Dict[int, dict]] = {}
+        try:
+            with open(self.data_file, "r") as file:
+                services = json.load(file)["services"]
+        except FileNotFoundError:
+            services = []
+        except (json.JSONDecodeError, KeyError) as e:
+            self.logger.warning(
+                f"Could not read {self.data_file}, keeping the catalog loaded before: {e}"
+            )
+            return False
+        for service in services:
+            put_service(by_sid, by_category, service)
+        with self._lock:
+            self._by_sid, self._by_category = by_sid, by_category
+            self._max_sid = max(by_sid, default=0)
+            self._version += 1
+        self.logger.debug(f"Loaded {len(services)} services from {self.data_file}")
+        return True
+
+    def _apply(self, records: List[dict]):
+        """
+        Applies journal records to copies of the catalog's dicts and swaps
+        them in, so readers never see the catalog in the middle of a change.
+        """
+        if not records:
+            return
+        by_sid = dict(self._by_sid)
+        by_category = {
+            category: dict(members) for category, members in self._by_category.items()
+        }
+        max_sid = self._max_sid
+        for record in records:
+            if record["op"] == PUT:
+                put_service(by_sid, by_category, record["service"])
+                max_sid = max(max_sid, record["service"]["SID"])
+            elif record["op"] == DELETE:
+                remove_service(by_sid, by_category, record["SID"])
+        with self._lock:
+            self._by_sid, self._by_category = by_sid, by_category
+            self._max_sid = max_sid
+            self._version += len(records)
+
+    def version(self) -> int:
+        """Returns a number that changes whenever the catalog changes (in this process)."""
+        self._refresh()
+        return self._version
+
+    def all(self) -> List[dict]:
+        """Returns the list of services."""
+        self._refresh()
+        return list(self._by_sid.values())
+
+    def get(self, sid: int) -> Optional[dict]:
+        """Returns the service with the given SID or None."""
+        self._refresh()
+        return self._by_sid.get(sid)
+
+    def in_category(self, category: str) -> List[dict]:
+        """Returns the services of a category."""
+        self._refresh()
+        return list(self._by_category.get(category, {}).values())
+
+    def create(self, service_data: dict) -> dict:
+        """Adds a service with the next free SID and returns it."""
+        with self._lock, self.file_lock.acquire():
+            self._sync_with_files()
+            service = {**service_data, "SID": self._max_sid + 1}
+            self._write({"op": PUT, "service": service})
+            return service
+
+    def update(self, sid: int, update_data: dict) -> Optional[dict]:
+        """Merges `update_data` into a service. Returns the updated service or None."""
+        with self._lock, self.file_lock.acquire():
+            self._sync_with_files()
+            service = self._by_sid.get(sid)
+            if service is None:
+                return None
+            service = {**service, **update_data, "SID": sid}
+            self._write({"op": PUT, "service": service})
+            return service
+
+    def delete(self, sid: int) -> bool:
+        """Deletes a service. Returns False if it did not exist."""
+        with self._lock, self.file_lock.acquire():
+            self._sync_with_files()
+            if sid not in self._by_sid:
+                return False
+            self._write({"op": DELETE, "SID": sid})
+            return True
+
+    def _write(self, record: dict):
+        """Journals and applies a record. Needs the file lock, with the catalog in sync."""
+        if self.journal.stat()[1] != self._journal_offset:
+            # Left by a writer that crashed mid-append
+            self.journal.truncate(self._journal_offset)
+        self._journal_offset += self.journal.append(record)
+        self._journal_inode = self.journal.stat()[0]
+        self._apply([record])
+        self._journal_records += 1
+
+        if self._journal_records >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Writes the catalog to a new snapshot and empties the journal. Needs the file lock."""
+        tmp_file = f"{self.data_file}.tmp"
+        with open(tmp_file, "w") as file:
+            json.dump({"services": list(self._by_sid.values())}, file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_file, self.data_file)
+        # Replaying the old journal over the new snapshot is harmless if we stop here
+        self.journal.reset()
+
+        self._snapshot_id = self._stat_snapshot()
+        self._journal_inode = self.journal.stat()[0]
+        self._journal_offset = 0
+        self._journal_records = 0
+        self.logger.info(f"Compacted service catalog into {self.data_file}")
+
+
+class DatabaseServiceCatalog:
+    """
+    The service catalog in the main database (`service_catalog` table).
+
+    Services are looked up through the indexes on SID, category and name, and
+    every write bumps the counter in `service_catalog_version` in the same
+    transaction, so readers keeping a copy know when to reload it.
+    """
+
+    def __init__(self, db_cfg: DictConfig):
+        self.logger = get_logger("service")
+        self.logger.debug("Connecting to database: %s", db_cfg.url)
+
+        self.engine = create_db_engine(db_cfg)
+        Base.metadata.create_all(self.engine)
+
+        self.session = sessionmaker(bind=self.engine)
+
+        self.logger.info("Connected to database: %s", db_cfg.url)
+
+    def version(self) -> int:
+        """Returns the number of changes made to the catalog."""
+        with self.session() as db:
+            row = db.get(CatalogVersion, 1)
+            return row.version if row else 0
+
+    def all(self) -> List[dict]:
+        """Returns the list of services."""
+        with self.session() as db:
+            services = db.query(CatalogService).order_by(CatalogService.SID)
+            return [service.to_dict() for service in services]
+
+    def get(self, sid: int) -> Optional[dict]:
+        """Returns the service with the given SID or None."""
+        with self.session() as db:
+            service = db.get(CatalogService, sid)
+            return service.to_dict() if service else None
+
+    def in_category(self, category: str) -> List[dict]:
+        """Returns the services of a category."""
+        with self.session() as db:
+            services = (
+                db.query(CatalogService)
+                .filter_by(service_category=category)
+                .order_by(CatalogService.SID)
+            )
+            return [service.to_dict() for service in services]
+
+    def create(self, service_data: dict) -> dict:
+        """Adds a service with the next free SID and returns it."""
+        with self.session.begin() as db:
+            service = CatalogService.from_dict({**service_data, "SID": None})
+            db.add(service)
+            self._bump_version(db)
+            db.flush()
+            return service.to_dict()
+
+    def update(self, sid: int, update_data: dict) -> Optional[dict]:
+        """Merges `update_data` into a service. Returns the updated service or None."""
+        with self.session.begin() as db:
+            service = db.get(CatalogService, sid)
+            if service is None:
+                return None
+            updated = CatalogService.from_dict(
+                {**service.to_dict(), **update_data, "SID": sid}
+            )
+            service.service_category = updated.service_category
+            service.service_name = updated.service_name
+            service.details = updated.details
+            service.extra = updated.extra
+            self._bump_version(db)
+            db.flush()
+            return service.to_dict()
+
+    def delete(self, sid: int) -> bool:
+        """Deletes a service. Returns False if it did not exist."""
+        with self.session.begin() as db:
+            deleted = db.query(CatalogService).filter_by(SID=sid).delete()
+            if deleted:
+                self._bump_version(db)
+            return bool(deleted)
+
+    def replace_all(self, services: List[dict]):
+        """Replaces the whole catalog in one transaction."""
+        with self.session.begin() as db:
+            db.query(CatalogService).delete()
+            db.add_all(CatalogService.from_dict(service) for service in services)
+            self._bump_version(db)
+
+    def _bump_version(self, db):
+        bumped = (
+            db.query(CatalogVersion)
+            .filter_by(id=1)
+            .update({CatalogVersion.version: CatalogVersion.version + 1})
+        )
+        if not bumped:
+            db.add(CatalogVersion(id=1, version=1))
+
+
+def create_service_catalog(
+    cfg: DictConfig, data_file: str
+) -> Union[ServiceCatalog, DatabaseServiceCatalog]:
+    """Creates the catalog selected by service.catalog.backend ("database" or "json")."""
+    catalog_cfg = cfg.service.catalog
+    backend = catalog_cfg.backend
+
+    if backend == "database":
+        return DatabaseServiceCatalog(cfg.database)
+    if backend == "json":
+        return ServiceCatalog(
+            data_file,
+            fsync_interval_s=catalog_cfg.fsync_interval_s,
+            compact_every=catalog_cfg.compact_every,
+        )
+
+    raise ValueError(f"Unknown service.catalog.backend: {backend}")
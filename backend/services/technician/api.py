@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 from services.technician.services import TechnicianService
 from services.technician.schemas import TechnicianCreate, TechnicianUpdate
 from services.technician.models import Technician
+from shared.db import register_teardown
 from shared.utils import with_hydra_config, get_logger
 
 load_dotenv()
@@ -73,6 +74,43 @@ def get_technician(tid: str):
         return jsonify({"error": "Technician not found"}), 404
 
 
+@app.route("/technicians/batch", methods=["POST"])
+def get_technicians_batch():
+    """
+    Retrieves many technicians by ID in a single query.
+
+    Expects:
+      - POST request to /technicians/batch
+      - JSON request body with 'tids' (list of technician IDs) and an optional 'service_category' filter.
+
+    Returns:
+      - 200 OK: JSON response with the list of matching technician data (unknown IDs are skipped).
+      - 400 Bad Request: If 'tids' is missing, a TID is malformed or the service_category is invalid.
+    """
+
+    logger.info(f"Received {request.method} request to /technicians/batch")
+
+    data = request.get_json() or {}
+    tids = data.get("tids")
+
+    if not isinstance(tids, list):
+        return jsonify({"error": "'tids' must be a list of technician IDs"}), 400
+
+    try:
+        tid_uuids = [UUID(tid) for tid in tids]
+    except (ValueError, TypeError, AttributeError):
+        return jsonify({"error": "Invalid TID format"}), 400
+
+    try:
+        technicians = technician_service.get_technicians(
+            tid_uuids, data.get("service_category")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify([tech.to_dict() for tech in technicians]), 200
+
+
 @app.route("/technicians", methods=["GET"])
 def get_technician_by_email():
     """
@@ -201,7 +239,7 @@ def delete_technician(tid: str):
 @app.route("/technicians/available", methods=["GET"])
 def get_available_technicians():
     """
-    Gets available technicians based on service_category, longitude, and latitude.
+    Gets available technicians based on service_category, ranked by distance from longitude and latitude.
 
     Expects:
       - GET request to /technicians/available
@@ -209,10 +247,12 @@ def get_available_technicians():
         - 'service_category': The service_category of the technicians to retrieve.
         - 'longitude': The longitude of the location.
         - 'latitude': The latitude of the location.
+        - 'limit' (optional): The maximum number of technicians to return.
+        - 'max_distance_km' (optional): Only return technicians within this distance.
 
     Returns:
-      - 200 OK: JSON response with a list of available technician data.
-      - 400 Bad Request: If any of the required query parameters are missing.
+      - 200 OK: JSON response with a list of available technician data, nearest first, each with a 'distance_km'.
+      - 400 Bad Request: If any of the required query parameters are missing or invalid.
     """
 
     logger.info(f"Received {request.method} request to /technicians/available")
@@ -220,6 +260,8 @@ def get_available_technicians():
     service_category = request.args.get("service_category")
     longitude = request.args.get("longitude")
     latitude = request.args.get("latitude")
+    limit = request.args.get("limit")
+    max_distance_km = request.args.get("max_distance_km")
 
     if not service_category or not longitude or not latitude:
         return jsonify({"error": "Missing required query parameters"}), 400
@@ -230,10 +272,41 @@ def get_available_technicians():
     except ValueError:
         return jsonify({"error": "Invalid longitude or latitude values"}), 400
 
-    available_technicians = technician_service.get_available_technicians(
-        service_category, longitude, latitude
+    try:
+        limit = int(limit) if limit is not None else None
+        max_distance_km = (
+            float(max_distance_km) if max_distance_km is not None else None
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid limit or max_distance_km values"}), 400
+
+    if (limit is not None and limit <= 0) or (
+        max_distance_km is not None and max_distance_km < 0
+    ):
+        return jsonify({"error": "Invalid limit or max_distance_km values"}), 400
+
+    try:
+        available_technicians = technician_service.get_available_technicians(
+            service_category, longitude, latitude, limit, max_distance_km
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return (
+        jsonify(
+            [
+                {**tech.to_dict(), "distance_km": distance}
+                for tech, distance in available_technicians
+            ]
+        ),
+        200,
     )
-    return jsonify([tech.to_dict() for tech in available_technicians]), 200
+
+
+@app.route("/technicians/cache", methods=["GET"])
+def cache_stats():
+    """Hit and miss counts of the technician cache (lookups by ID and by email), to size it."""
+    return jsonify(technician_service.cache.stats()), 200
 
 
 @with_hydra_config
@@ -241,7 +314,13 @@ def main(cfg: DictConfig):
     global technician_service
 
     logger.info("Initializing Technician service")
-    technician_service = TechnicianService(cfg.database.url)
+    technician_service = TechnicianService(
+        cfg.database,
+        initial_radius_km=cfg.technician.available.initial_radius_km,
+        cache_size=cfg.technician.cache.maxsize,
+        cache_ttl_s=cfg.technician.cache.ttl_s,
+    )
+    register_teardown(app, technician_service.db)
 
     logger.info("Starting Flask server...")
     app.run(**cfg.technician.server)
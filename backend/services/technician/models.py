@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, UUID, Enum, String, Float, Boolean
+from sqlalchemy import Column, UUID, Enum, String, Float, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 from shared.enums import IDProofType, ServiceCategory
@@ -9,6 +9,17 @@ Base = declarative_base()
 
 class Technician(Base):
     __tablename__ = "technicians"
+    # Available technicians of a category in a bounding box are one index range
+    # on latitude, see TechnicianService.get_available_technicians
+    __table_args__ = (
+        Index(
+            "ix_technicians_category_available_location",
+            "service_category",
+            "is_available",
+            "latitude",
+            "longitude",
+        ),
+    )
 
     TID = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     email = Column(String(50), unique=True, nullable=False)
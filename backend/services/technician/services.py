@@ -1,26 +1,46 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from omegaconf import DictConfig
+from sqlalchemy import or_
 from uuid import UUID
-from typing import Optional, List
+from typing import Optional, List, Tuple
+import numpy as np
 
+from shared.cache import LRUCache
+from shared.db import create_db_engine, create_scoped_session
 from shared.utils import get_logger
+from shared.geo import MAX_DISTANCE_KM, bounding_box, haversine_km_array
 from shared.enums import ServiceCategory
 from services.technician.schemas import TechnicianCreate, TechnicianUpdate
 from services.technician.models import Technician, Base
 
 
 class TechnicianService:
-    def __init__(self, db_url: str):
+    def __init__(
+        self,
+        db_cfg: DictConfig,
+        initial_radius_km: float = 5.0,
+        cache_size: int = 10000,
+        cache_ttl_s: Optional[float] = 60.0,
+    ):
         self.logger = get_logger("technician")
-        self.logger.debug("Connecting to database: %s", db_url)
+        self.logger.debug("Connecting to database: %s", db_cfg.url)
 
-        self.engine = create_engine(db_url, pool_size=20, max_overflow=10)
+        self.engine = create_db_engine(db_cfg)
         Base.metadata.create_all(self.engine)
+        # create_all skips tables that exist, so add indexes missing from older databases
+        for index in Technician.__table__.indexes:
+            index.create(self.engine, checkfirst=True)
 
-        self.session = sessionmaker(bind=self.engine)
-        self.db = self.session()
+        # A session per request thread, closed when the request ends
+        self.db = create_scoped_session(self.engine)
 
-        self.logger.info(f"Connected to database: %s", db_url)
+        self.logger.info(f"Connected to database: %s", db_cfg.url)
+
+        # First radius searched for the nearest available technicians
+        self.initial_radius_km = initial_radius_km
+
+        # Technicians by ("TID", TID) and ("email", email), detached from any session.
+        # Dropped on update and delete here, other workers see changes within the TTL.
+        self.cache = LRUCache(cache_size, cache_ttl_s)
 
     def register_technician(
         self, technician_data: TechnicianCreate
@@ -44,7 +64,10 @@ class TechnicianService:
 
     def get_technician(self, TID: UUID) -> Optional[Technician]:
         """Gets a technician by their TID"""
-        technician = self.db.query(Technician).filter_by(TID=TID).first()
+        technician = self.cache.get(("TID", TID))
+        if technician is None:
+            technician = self.db.query(Technician).filter_by(TID=TID).first()
+            self._cache(technician)
 
         if not technician:
             self.logger.debug("Technician not found with TID: %s", TID)
@@ -56,7 +79,10 @@ class TechnicianService:
 
     def get_technician_by_email(self, email: str) -> Optional[Technician]:
         """Gets a technician by their email id"""
-        technician = self.db.query(Technician).filter_by(email=email).first()
+        technician = self.cache.get(("email", email))
+        if technician is None:
+            technician = self.db.query(Technician).filter_by(email=email).first()
+            self._cache(technician)
 
         if not technician:
             self.logger.debug("Technician not found with Email: %s", email)
@@ -66,16 +92,43 @@ class TechnicianService:
 
         return technician
 
+    def get_technicians(
+        self, TIDs: List[UUID], service_category_str: Optional[str] = None
+    ) -> List[Technician]:
+        """
+        Gets many technicians by TID in one query, optionally filtered by service_category.
+
+        Not cached: availability and location change too often for cached
+        copies to be used for matching.
+        """
+
+        self.logger.debug("Getting %d technicians by TID", len(TIDs))
+
+        if not TIDs:
+            return []
+
+        query = self.db.query(Technician).filter(Technician.TID.in_(TIDs))
+
+        if service_category_str:
+            query = query.filter(
+                Technician.service_category
+                == self._parse_service_category(service_category_str)
+            )
+
+        return query.all()
+
     def update_technician(
         self, TID: UUID, update_data: TechnicianUpdate
     ) -> Optional[Technician]:
         """Updates a technician's details"""
         self.logger.debug("Updating technician with ID: %s", TID)
 
-        technician = self.get_technician(TID)
+        # Not from the cache, the session must track the changes
+        technician = self.db.query(Technician).filter_by(TID=TID).first()
         if not technician:
             self.logger.warning("Technician not found for update: %s", TID)
             return None
+        self._uncache(technician)
 
         for field, value in update_data.model_dump(
             exclude_unset=True, exclude_none=True
@@ -83,6 +136,9 @@ class TechnicianService:
             setattr(technician, field, value)
 
         self.db.commit()
+        # Location and availability updates included. Dropped again after the
+        # commit, with the new email, in case a lookup cached the old row meanwhile
+        self._uncache(technician)
 
         self.logger.info("Updated technician with ID: %s", technician.TID)
         self.logger.debug("Updated fields: %s", update_data.model_dump())
@@ -94,47 +150,161 @@ class TechnicianService:
 
         self.logger.debug("Deleting technician with ID: %s", TID)
 
-        technician = self.get_technician(TID)
+        technician = self.db.query(Technician).filter_by(TID=TID).first()
         if not technician:
             self.logger.warning("Technician not found for deletion: %s", TID)
             return None
 
         self.db.delete(technician)
         self.db.commit()
+        self._uncache(technician)
 
         self.logger.info("Deleted technician with ID: %s", technician.TID)
 
         return technician
 
     def get_available_technicians(
-        self, service_category_str: str, longitude: float, latitude: float
-    ) -> List[Technician]:
-        """Gets available technicians based on service_category and location"""
+        self,
+        service_category_str: str,
+        longitude: float,
+        latitude: float,
+        limit: Optional[int] = None,
+        max_distance_km: Optional[float] = None,
+    ) -> List[Tuple[Technician, Optional[float]]]:
+        """
+        Gets available technicians of a service_category ranked by distance from (latitude, longitude).
+
+        Returns (technician, distance_km) pairs, nearest first. Technicians without a
+        known location come last with a distance of None and are dropped when
+        max_distance_km is given.
+        """
 
         self.logger.debug(f"Getting available technicians for {service_category_str}")
 
+        service_category = self._parse_service_category(service_category_str)
+
+        # Rank on the coordinates alone, then load only the technicians that are returned
+        query = self.db.query(
+            Technician.TID, Technician.latitude, Technician.longitude
+        ).filter(
+            Technician.service_category == service_category,  # Use the enum member
+            Technician.is_available == True,
+        )
+        rows = self._nearby_rows(query, latitude, longitude, limit, max_distance_km)
+
+        if not rows:
+            return []
+
+        tids = [row.TID for row in rows]
+        coordinates = np.array(
+            [(row.latitude, row.longitude) for row in rows], dtype=np.float64
+        )  # None becomes NaN
+
+        distances = haversine_km_array(
+            latitude, longitude, coordinates[:, 0], coordinates[:, 1]
+        )
+
+        if max_distance_km is not None:
+            candidates = np.flatnonzero(distances <= max_distance_km)
+        else:
+            candidates = np.arange(len(rows))
+
+        if limit is not None and limit < len(candidates):
+            nearest = np.argpartition(distances[candidates], limit - 1)[:limit]
+            candidates = candidates[nearest]
+
+        # NaN distances (unknown locations) sort last
+        order = candidates[np.argsort(distances[candidates], kind="stable")]
+
+        technicians = {
+            technician.TID: technician
+            for technician in self.get_technicians([tids[i] for i in order])
+        }
+
+        return [
+            (
+                technicians[tids[i]],
+                None if np.isnan(distances[i]) else float(distances[i]),
+            )
+            for i in order
+            if tids[i] in technicians
+        ]
+
+    def _cache(self, technician: Optional[Technician]):
+        """Caches a technician loaded by the current session, detaching it so it outlives the request."""
+        if technician is None:
+            return
+        self.db.expunge(technician)
+        self.cache.put(("TID", technician.TID), technician)
+        self.cache.put(("email", technician.email), technician)
+
+    def _uncache(self, technician: Technician):
+        self.cache.pop(("TID", technician.TID))
+        self.cache.pop(("email", technician.email))
+
+    def _nearby_rows(
+        self,
+        query,
+        latitude: float,
+        longitude: float,
+        limit: Optional[int],
+        max_distance_km: Optional[float],
+    ) -> list:
+        """
+        Fetches the rows of `query` that can be among the `limit` nearest within `max_distance_km`.
+
+        The database only returns rows in the bounding box of a radius. With a
+        limit, the radius starts at `initial_radius_km` and doubles until the
+        box holds `limit` rows within the radius, or reaches max_distance_km
+        (or the whole earth, then rows without a location are included too).
+        """
+        if limit is None:
+            if max_distance_km is None:
+                return query.all()
+            return self._in_box(query, latitude, longitude, max_distance_km).all()
+
+        radius_km = self.initial_radius_km
+        while True:
+            if max_distance_km is not None:
+                radius_km = min(radius_km, max_distance_km)
+            elif radius_km >= MAX_DISTANCE_KM:
+                return query.all()
+
+            rows = self._in_box(query, latitude, longitude, radius_km).all()
+            if radius_km == max_distance_km:
+                return rows
+            distances = haversine_km_array(
+                latitude,
+                longitude,
+                np.array([row.latitude for row in rows], dtype=np.float64),
+                np.array([row.longitude for row in rows], dtype=np.float64),
+            )
+            if np.count_nonzero(distances <= radius_km) >= limit:
+                return rows
+            radius_km *= 2
+
+    @staticmethod
+    def _in_box(query, latitude: float, longitude: float, radius_km: float):
+        """Filters `query` to the technicians in the bounding box of a circle."""
+        min_lat, max_lat, longitudes = bounding_box(latitude, longitude, radius_km)
+        query = query.filter(Technician.latitude.between(min_lat, max_lat))
+        if longitudes is None:
+            return query.filter(Technician.longitude.isnot(None))
+
+        min_lon, max_lon = longitudes
+        if min_lon <= max_lon:
+            return query.filter(Technician.longitude.between(min_lon, max_lon))
+        # Crosses the antimeridian
+        return query.filter(
+            or_(Technician.longitude >= min_lon, Technician.longitude <= max_lon)
+        )
+
+    def _parse_service_category(self, service_category_str: str) -> ServiceCategory:
+        """Converts a service_category value to the ServiceCategory enum"""
         try:
-            service_category = ServiceCategory(service_category_str)
+            return ServiceCategory(service_category_str)
         except ValueError:
             valid_values = [e.value for e in ServiceCategory]
             error_message = f"Invalid value for ServiceCategory: {service_category_str}. Valid values are: {', '.join(valid_values)}"
             self.logger.error(error_message)
             raise ValueError(error_message)
-
-        available_technicians = (
-            self.db.query(Technician)
-            .filter(
-                Technician.service_category == service_category,  # Use the enum member
-                Technician.is_available == True,
-            )
-            .all()
-        )
-
-        # **Simplified distance calculation (replace with a more accurate method)**
-        # def calculate_distance(tech: Technician):
-        # Use a distance formula (e.g., Haversine) for accurate calculation
-        # return 0  # Placeholder for distance calculation
-
-        # available_technicians.sort(key=calculate_distance)
-
-        return available_technicians
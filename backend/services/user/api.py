@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 from services.user.services import UserService
 from services.user.schemas import UserCreate, UserUpdate
 from services.user.models import User
+from shared.db import register_teardown
 from shared.utils import with_hydra_config, get_logger
 
 load_dotenv()
@@ -183,12 +184,23 @@ def delete_user(uid: str):
         return jsonify({"error": "User not found"}), 404
 
 
+@app.route("/users/cache", methods=["GET"])
+def cache_stats():
+    """Hit and miss counts of the user cache (lookups by ID and by email), to size it."""
+    return jsonify(user_service.cache.stats()), 200
+
+
 @with_hydra_config
 def main(cfg: DictConfig):
     global user_service
 
     logger.info("Initializing User service")
-    user_service = UserService(cfg.database.url)
+    user_service = UserService(
+        cfg.database,
+        cache_size=cfg.user.cache.maxsize,
+        cache_ttl_s=cfg.user.cache.ttl_s,
+    )
+    register_teardown(app, user_service.db)
 
     logger.info("Starting Flask server...")
     app.run(**cfg.user.server)
@@ -1,25 +1,35 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from omegaconf import DictConfig
 from uuid import UUID
 from typing import Optional
 
 from services.user.schemas import UserCreate, UserUpdate
 from services.user.models import User, Base
+from shared.cache import LRUCache
+from shared.db import create_db_engine, create_scoped_session
 from shared.utils import get_logger
 
 
 class UserService:
-    def __init__(self, db_url: str):
+    def __init__(
+        self,
+        db_cfg: DictConfig,
+        cache_size: int = 10000,
+        cache_ttl_s: Optional[float] = 60.0,
+    ):
         self.logger = get_logger("user")
-        self.logger.debug("Connecting to database: %s", db_url)
+        self.logger.debug("Connecting to database: %s", db_cfg.url)
 
-        self.engine = create_engine(db_url, pool_size=20, max_overflow=10)
+        self.engine = create_db_engine(db_cfg)
         Base.metadata.create_all(self.engine)
 
-        self.session = sessionmaker(bind=self.engine)
-        self.db = self.session()
+        # A session per request thread, closed when the request ends
+        self.db = create_scoped_session(self.engine)
 
-        self.logger.info(f"Connected to database: %s", db_url)
+        self.logger.info(f"Connected to database: %s", db_cfg.url)
+
+        # Users by ("uid", uid) and ("email", email), detached from any session.
+        # Dropped on update and delete here, other workers see changes within the TTL.
+        self.cache = LRUCache(cache_size, cache_ttl_s)
 
     def register_user(self, user_data: UserCreate) -> Optional[User]:
         """Creates a new User"""
@@ -41,7 +51,10 @@ class UserService:
 
     def get_user(self, uid: UUID) -> Optional[User]:
         """Gets a user by their UID"""
-        user = self.db.query(User).filter_by(uid=uid).first()
+        user = self.cache.get(("uid", uid))
+        if user is None:
+            user = self.db.query(User).filter_by(uid=uid).first()
+            self._cache(user)
 
         if not user:
             self.logger.debug("User not found with UID: %s", uid)
@@ -53,7 +66,10 @@ class UserService:
 
     def get_user_by_email(self, email: str) -> Optional[User]:
         """Gets a user by their email id"""
-        user = self.db.query(User).filter_by(email=email).first()
+        user = self.cache.get(("email", email))
+        if user is None:
+            user = self.db.query(User).filter_by(email=email).first()
+            self._cache(user)
 
         if not user:
             self.logger.debug("User not found with Email: %s", email)
@@ -67,10 +83,12 @@ class UserService:
         """Updates a user's details"""
         self.logger.debug("Updating user with ID: %s", uid)
 
-        user = self.get_user(uid)
+        # Not from the cache, the session must track the changes
+        user = self.db.query(User).filter_by(uid=uid).first()
         if not user:
             self.logger.warning("User not found for update: %s", uid)
             return None
+        self._uncache(user)
 
         for field, value in update_data.model_dump(
             exclude_unset=True, exclude_none=True
@@ -78,6 +96,7 @@ class UserService:
             setattr(user, field, value)
 
         self.db.commit()
+        self._uncache(user)  # the new email too, if a lookup missed it meanwhile
 
         self.logger.info("Updated user with ID: %s", user.uid)
         self.logger.debug("Updated fields: %s", update_data.model_dump())
@@ -89,14 +108,27 @@ class UserService:
 
         self.logger.debug("Deleting user with ID: %s", uid)
 
-        user = self.get_user(uid)
+        user = self.db.query(User).filter_by(uid=uid).first()
         if not user:
             self.logger.warning("User not found for deletion: %s", uid)
             return None
 
         self.db.delete(user)
         self.db.commit()
+        self._uncache(user)
 
         self.logger.info("Deleted user with ID: %s", user.uid)
 
         return user
+
+    def _cache(self, user: Optional[User]):
+        """Caches a user loaded by the current session, detaching it so it outlives the request."""
+        if user is None:
+            return
+        self.db.expunge(user)
+        self.cache.put(("uid", user.uid), user)
+        self.cache.put(("email", user.email), user)
+
+    def _uncache(self, user: User):
+        self.cache.pop(("uid", user.uid))
+        self.cache.pop(("email", user.email))
@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Thread-safe mapping keeping the `maxsize` most recently used entries.
+
+    Entries older than `ttl_s` (if given) are dropped when looked up, which
+    bounds how stale a value changed elsewhere can be. Counts hits and
+    misses, so hit rates can be exposed by the services using it.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_s: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+
+        # key: (monotonic expiry time, value)
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the value for `key` and marks it as most recently used, or `default`."""
+        with self._lock:
+            try:
+                expires_at, value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Stores a value, evicting the least recently used entry when full."""
+        if self.maxsize <= 0:
+            return
+        expires_at = (
+            time.monotonic() + self.ttl_s if self.ttl_s is not None else float("inf")
+        )
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        """Drops the entry for `key`, if any."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drops every entry. Hit and miss counts are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_s": self.ttl_s,
+            }
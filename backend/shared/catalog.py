@@ -0,0 +1,100 @@
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+
+
+class ServiceCatalogCache:
+    """
+    In-process copy of the service catalog, indexed by SID.
+
+    The whole catalog is fetched from the service microservice once and kept
+    for `ttl_s` seconds. The service microservice also calls `invalidate` (via
+    POST /catalog/invalidate) whenever a service is created, updated or
+    deleted, so the TTL only bounds staleness when a notification is lost.
+    A SID missing from the copy is fetched individually, so services created
+    since the last load are found without a full reload.
+    """
+
+    def __init__(
+        self,
+        service_api_url: str,
+        ttl_s: float = 300.0,
+        timeout_s: float = 5.0,
+        logger=None,
+    ):
+        self.service_api_url = service_api_url
+        self.ttl_s = ttl_s
+        self.timeout_s = timeout_s
+        self.logger = logger
+
+        self._services: Dict[int, dict] = {}  # SID: service
+        self._loaded_at: Optional[float] = None  # monotonic time of the last full load
+        self._lock = threading.Lock()
+
+    def get(self, sid) -> Optional[dict]:
+        """
+        Returns the service with the given SID, or None if it does not exist.
+
+        When the service microservice cannot be reached, the last known copy
+        of the service is returned (None if it was never loaded).
+        """
+        try:
+            sid = int(sid)
+        except (TypeError, ValueError):
+            return None
+
+        with self._lock:
+            if self._is_stale():
+                self._reload()
+            service = self._services.get(sid)
+            if service is None:
+                service = self._fetch(sid)
+            return service
+
+    def invalidate(self, sid=None):
+        """Drops the cached copy of one service, or marks the whole catalog for reload."""
+        with self._lock:
+            if sid is None:
+                self._loaded_at = None
+                return
+            try:
+                self._services.pop(int(sid), None)
+            except (TypeError, ValueError):
+                pass
+
+    def _is_stale(self) -> bool:
+        return (
+            self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl_s
+        )
+
+    def _reload(self):
+        try:
+            response = requests.get(self.service_api_url, timeout=self.timeout_s)
+            response.raise_for_status()
+            self._services = {service["SID"]: service for service in response.json()}
+            self._loaded_at = time.monotonic()
+            if self.logger:
+                self.logger.debug(f"Loaded {len(self._services)} services into cache")
+        except requests.exceptions.RequestException as e:
+            # Keep serving the stale copy, the next lookup retries the load
+            if self.logger:
+                self.logger.error(f"Error loading service catalog: {e}")
+
+    def _fetch(self, sid: int) -> Optional[dict]:
+        try:
+            response = requests.get(
+                f"{self.service_api_url}/{sid}", timeout=self.timeout_s
+            )
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            if self.logger:
+                self.logger.error(f"Error fetching service {sid}: {e}")
+            return None
+
+        service = response.json()
+        self._services[sid] = service
+        return service
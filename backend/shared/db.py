@@ -0,0 +1,90 @@
+from flask import Flask
+from omegaconf import DictConfig
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+
+# Applied to every new SQLite connection, see the `database.sqlite` config
+SQLITE_PRAGMAS = (
+    "journal_mode",
+    "synchronous",
+    "busy_timeout",
+    "mmap_size",
+    "cache_size",
+    "temp_store",
+)
+
+
+def create_db_engine(db_cfg: DictConfig) -> Engine:
+    """
+    Creates the engine for the `database` config block.
+
+    SQLite files get the pragmas of `database.sqlite` on every connection
+    (WAL so readers do not wait for the writer, a busy timeout instead of
+    "database is locked" errors) and a pool of connections shared across
+    threads, without the liveness checks only a server needs. In-memory
+    SQLite uses a single connection, so every thread sees the same
+    database. Other databases get a pool sized by `database.pool`.
+    """
+    url = make_url(db_cfg.url)
+    pool_cfg = db_cfg.get("pool", {})
+
+    if url.get_backend_name() != "sqlite":
+        return create_engine(
+            url,
+            poolclass=QueuePool,
+            pool_size=pool_cfg.get("size", 20),
+            max_overflow=pool_cfg.get("max_overflow", 10),
+            pool_recycle=pool_cfg.get("recycle_s", -1),
+            pool_pre_ping=pool_cfg.get("pre_ping", True),
+        )
+
+    sqlite_cfg = db_cfg.get("sqlite", {})
+    # Connections are handed to whichever thread checks them out
+    connect_args = {"check_same_thread": False}
+    if url.database in (None, "", ":memory:"):
+        engine = create_engine(url, poolclass=StaticPool, connect_args=connect_args)
+    else:
+        engine = create_engine(
+            url,
+            poolclass=QueuePool,
+            pool_size=pool_cfg.get("size", 20),
+            max_overflow=pool_cfg.get("max_overflow", 10),
+            connect_args=connect_args,
+        )
+
+    pragmas = [
+        f"PRAGMA {name} = {sqlite_cfg[name]}"
+        for name in SQLITE_PRAGMAS
+        if sqlite_cfg.get(name) is not None
+    ]
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return engine
+
+
+def create_scoped_session(engine: Engine) -> scoped_session:
+    """
+    Creates a session registry giving each thread (i.e. each Flask request)
+    its own session, with its own pooled connection.
+
+    The registry proxies the Session API (`db.query(...)`, `db.commit()`, ...),
+    so services can keep using it as `self.db`. Call `register_teardown` so
+    the session is closed at the end of each request.
+    """
+    return scoped_session(sessionmaker(bind=engine))
+
+
+def register_teardown(app: Flask, db: scoped_session):
+    """Closes the session of the current thread when a request ends, returning its connection to the pool."""
+
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        db.remove()
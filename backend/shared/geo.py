@@ -0,0 +1,83 @@
+from math import degrees, isfinite, pi, radians, sin, cos, asin, sqrt
+from typing import Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+# Farthest any two points can be, half the circumference
+MAX_DISTANCE_KM = pi * EARTH_RADIUS_KM
+
+
+def is_valid_location(lat: float, lon: float) -> bool:
+    """True if (lat, lon) are finite coordinates in degrees within their ranges."""
+    return isfinite(lat) and isfinite(lon) and -90 <= lat <= 90 and -180 <= lon <= 180
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Great-circle distance between two (latitude, longitude) points.
+
+    Args:
+        lat1, lon1: Coordinates of the first point in degrees.
+        lat2, lon2: Coordinates of the second point in degrees.
+
+    Returns:
+        The distance in kilometres.
+    """
+    lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
+    a = (
+        sin((lat2 - lat1) / 2) ** 2
+        + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * asin(sqrt(a))
+
+
+def haversine_km_array(
+    lat: float, lon: float, lats: np.ndarray, lons: np.ndarray
+) -> np.ndarray:
+    """
+    Vectorized great-circle distance from one point to many points.
+
+    Args:
+        lat, lon: Coordinates of the origin in degrees.
+        lats, lons: Arrays of coordinates in degrees (NaN for unknown locations).
+
+    Returns:
+        An array of distances in kilometres (NaN where the location is unknown).
+    """
+    lat, lon = radians(lat), radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = (
+        np.sin((lats - lat) / 2) ** 2
+        + cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def bounding_box(
+    lat: float, lon: float, radius_km: float
+) -> Tuple[float, float, Optional[Tuple[float, float]]]:
+    """
+    Smallest latitude/longitude box containing every point within `radius_km`.
+
+    Args:
+        lat, lon: Coordinates of the centre in degrees.
+        radius_km: The radius in kilometres.
+
+    Returns:
+        (min_lat, max_lat, longitudes). `longitudes` is (min_lon, max_lon),
+        with min_lon > max_lon when the box crosses the antimeridian, or
+        None when the circle reaches a pole and so spans every longitude.
+    """
+    angle = radius_km / EARTH_RADIUS_KM  # angular radius in radians
+    min_lat, max_lat = lat - degrees(angle), lat + degrees(angle)
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None
+
+    # Widest longitude difference over the circle, reached north of the
+    # centre in the northern hemisphere (and south of it in the southern)
+    delta_lon = degrees(asin(sin(angle) / cos(radians(lat))))
+    min_lon = (lon - delta_lon + 180) % 360 - 180
+    max_lon = (lon + delta_lon + 180) % 360 - 180
+    return min_lat, max_lat, (min_lon, max_lon)